@@ -0,0 +1,226 @@
+"""
+Cache columnar en memoria de ventas_detalle para pivotes de reportes.
+
+Cada columna es un array tipado (módulo array); producto y categoría van
+codificados como índice a un diccionario de nombres. La carga es incremental:
+solo se leen ventas con id mayor al último visto.
+"""
+import threading
+from array import array
+from collections import defaultdict
+from datetime import date
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import db
+
+DIAS_SEMANA = ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo")
+DIMENSIONES = ("producto", "categoria", "tipo", "fecha", "mes", "dia_semana", "hora")
+MEDIDAS = ("cantidad", "subtotal", "lineas")
+_TIPOS = (db.VENTA, db.MERMA)
+
+
+class CuboVentas:
+    def __init__(self):
+        self.ultimo_venta_id = 0
+        # Diccionarios
+        self.productos = []              # código -> nombre
+        self.categorias = []
+        self._cod_prod: Dict[int, int] = {}   # producto_id -> código
+        self._cod_cat: Dict[str, int] = {}
+        # Columnas
+        self.venta_id = array("q")
+        self.producto = array("l")
+        self.categoria = array("b")
+        self.tipo = array("b")
+        self.dia = array("l")            # ordinal de fecha
+        self.hora = array("b")
+        self.dia_semana = array("b")     # lunes = 0
+        self.cantidad = array("d")
+        self.subtotal = array("d")
+
+    def __len__(self):
+        return len(self.venta_id)
+
+    def _codigo_categoria(self, nombre: str) -> int:
+        c = self._cod_cat.get(nombre)
+        if c is None:
+            c = self._cod_cat[nombre] = len(self.categorias)
+            self.categorias.append(nombre)
+        return c
+
+    def cargar(self) -> int:
+        """Agrega las ventas nuevas desde la última carga. Devuelve las líneas agregadas."""
+        # Catálogo y ventas de la misma foto: un producto creado y vendido entre
+        # las dos consultas ya está en el catálogo leído
+        with db.lectura() as conn:
+            nuevos = conn.execute(
+                """SELECT p.id, p.nombre, IFNULL(c.nombre, '') AS categoria
+                   FROM productos p LEFT JOIN categorias c ON c.id=p.categoria_id"""
+            ).fetchall()
+            for p in nuevos:
+                if p["id"] not in self._cod_prod:
+                    self._cod_prod[p["id"]] = len(self.productos)
+                    self.productos.append(p["nombre"])
+            cat_prod = {p["id"]: self._codigo_categoria(p["categoria"]) for p in nuevos}
+
+            cur = conn.execute(
+                """SELECT v.id, v.tipo, v.creado_en, d.producto_id, d.cantidad, d.subtotal
+                   FROM ventas v JOIN ventas_detalle d ON d.venta_id=v.id
+                   WHERE v.id > ?
+                   ORDER BY v.id, d.id""",
+                (self.ultimo_venta_id,),
+            )
+            n = 0
+            cache_fecha: Dict[str, Tuple[int, int]] = {}
+            while True:
+                lote = cur.fetchmany(5000)
+                if not lote:
+                    break
+                for r in lote:
+                    ts = r["creado_en"] or ""
+                    f = ts[:10]
+                    od = cache_fecha.get(f)
+                    if od is None:
+                        d = date(int(f[0:4]), int(f[5:7]), int(f[8:10]))
+                        od = cache_fecha[f] = (d.toordinal(), d.weekday())
+                    self.venta_id.append(r["id"])
+                    self.producto.append(self._cod_prod[r["producto_id"]])
+                    self.categoria.append(cat_prod[r["producto_id"]])
+                    self.tipo.append(_TIPOS.index(r["tipo"]))
+                    self.dia.append(od[0])
+                    self.dia_semana.append(od[1])
+                    self.hora.append(int(ts[11:13] or 0))
+                    self.cantidad.append(r["cantidad"] or 0.0)
+                    self.subtotal.append(r["subtotal"] or 0.0)
+                n += len(lote)
+            if len(self.venta_id):
+                self.ultimo_venta_id = self.venta_id[-1]
+        return n
+
+    # ------- Consulta -------
+    def _mascara(self, tipo, desde, hasta, productos, categorias, horas, dias_semana) -> Optional[Iterable[bool]]:
+        conds = []
+        if tipo is not None:
+            t = _TIPOS.index(tipo)
+            conds.append((self.tipo, lambda x, t=t: x == t))
+        if desde:
+            d0 = date.fromisoformat(desde[:10]).toordinal()
+            conds.append((self.dia, lambda x, d0=d0: x >= d0))
+        if hasta:
+            d1 = date.fromisoformat(hasta[:10]).toordinal()
+            conds.append((self.dia, lambda x, d1=d1: x <= d1))
+        if productos:
+            wanted = set(productos)
+            ps = {c for c, nombre in enumerate(self.productos) if nombre in wanted}
+            conds.append((self.producto, ps.__contains__))
+        if categorias:
+            cs = {self._cod_cat[c] for c in categorias if c in self._cod_cat}
+            conds.append((self.categoria, cs.__contains__))
+        if horas:
+            hs = set(horas)
+            conds.append((self.hora, hs.__contains__))
+        if dias_semana:
+            ds = set(dias_semana)
+            conds.append((self.dia_semana, ds.__contains__))
+        if not conds:
+            return None
+        mask = [True] * len(self)
+        for col, pred in conds:
+            mask = [m and pred(x) for m, x in zip(mask, col)]
+        return mask
+
+    def _decodificar(self, dim: str, v):
+        if dim == "producto":
+            return self.productos[v]
+        if dim == "categoria":
+            return self.categorias[v]
+        if dim == "tipo":
+            return _TIPOS[v]
+        if dim == "fecha":
+            return date.fromordinal(v).isoformat()
+        if dim == "mes":
+            return date.fromordinal(v).strftime("%Y-%m")
+        if dim == "dia_semana":
+            return DIAS_SEMANA[v]
+        return v
+
+    def agrupar(
+        self,
+        por: Sequence[str],
+        medida: str = "subtotal",
+        tipo: Optional[str] = db.VENTA,
+        desde: Optional[str] = None,
+        hasta: Optional[str] = None,
+        productos: Optional[Sequence[str]] = None,
+        categorias: Optional[Sequence[str]] = None,
+        horas: Optional[Sequence[int]] = None,
+        dias_semana: Optional[Sequence[int]] = None,
+    ) -> Dict[tuple, float]:
+        """
+        Suma `medida` agrupando por las dimensiones de `por` (ver DIMENSIONES).
+        Las claves del resultado vienen decodificadas (nombres, fechas ISO, ...).
+        """
+        for d in por:
+            if d not in DIMENSIONES:
+                raise ValueError(f"Dimensión inválida: {d}")
+        if medida not in MEDIDAS:
+            raise ValueError(f"Medida inválida: {medida}")
+
+        cols = [self.dia if d in ("fecha", "mes") else getattr(self, d) for d in por]
+        valores = array("d", [1.0]) * len(self) if medida == "lineas" else getattr(self, medida)
+        mask = self._mascara(tipo, desde, hasta, productos, categorias, horas, dias_semana)
+
+        claves = zip(*cols) if cols else ((),) * len(self)
+        pares = zip(claves, valores)
+        if mask is not None:
+            pares = compress(pares, mask)
+        acc = defaultdict(float)
+        for k, v in pares:
+            acc[k] += v
+
+        # "mes" se agrupa por día y se compacta al decodificar
+        out: Dict[tuple, float] = defaultdict(float)
+        for k, v in acc.items():
+            out[tuple(self._decodificar(d, x) for d, x in zip(por, k))] += v
+        return dict(out)
+
+    def pivote(self, filas: str, columnas: str, medida: str = "subtotal", **filtros):
+        """Tabla filas × columnas: (etiquetas_filas, etiquetas_columnas, {(fila, col): valor})."""
+        g = self.agrupar((filas, columnas), medida, **filtros)
+        orden_col = list(DIAS_SEMANA) if columnas == "dia_semana" else None
+        fs = sorted({k[0] for k in g})
+        cs = orden_col or sorted({k[1] for k in g})
+        return fs, cs, g
+
+
+_cubo: Optional[CuboVentas] = None
+_cubo_lock = threading.Lock()
+
+
+def cubo_ventas() -> CuboVentas:
+    """Cubo compartido del proceso, actualizado con las ventas nuevas en cada llamada."""
+    global _cubo
+    # Los reportes corren en hilos (UI y lectores del servidor): una carga a la vez
+    with _cubo_lock:
+        if _cubo is None:
+            _cubo = CuboVentas()
+        _cubo.cargar()
+        return _cubo
+
+
+def pivote_ventas(
+    filas: str,
+    columnas: str = "dia_semana",
+    medida: str = "subtotal",
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+) -> Dict[str, List]:
+    """
+    Pivote del cubo compartido en forma serializable (para servidor.py):
+    {"filas": [...], "columnas": [...], "valores": [[valor por columna] por fila]}.
+    """
+    cubo = cubo_ventas()
+    with _cubo_lock:
+        fs, cs, g = cubo.pivote(filas, columnas, medida, desde=desde, hasta=hasta)
+    return {"filas": fs, "columnas": cs, "valores": [[g.get((f, c), 0.0) for c in cs] for f in fs]}
@@ -1,9 +1,69 @@
 import csv
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from db import *
+from analitica import pivote_ventas, DIAS_SEMANA
+from respaldo import RespaldoProgramado
+from paralelo import generar as generar_por_tramos
+from functools import partial
+import os
 import platform
 from tkinter import font as tkfont  
+
+# Si se indica un servidor (python servidor.py), las ventanas usan la BD compartida
+SERVIDOR = os.environ.get("CAFETERIA_SERVIDOR", "").strip()
+if SERVIDOR:
+    from cliente import instalar_cliente
+    instalar_cliente(globals(), SERVIDOR)
+
+# Respaldo periódico desde esta caja (horas; 0 = no). Con varias cajas sobre la misma
+# base debe activarse en una sola; con servidor lo hace servidor.py (--respaldo-horas).
+RESPALDO_HORAS = float(os.environ.get("CAFETERIA_RESPALDO_HORAS", "0") or 0)
+
+
+class SincronizadorTabla:
+    """
+    Mantiene un Treeview igual a una lista de filas (clave, valores) tocando solo lo que cambió:
+    borra las claves que ya no vienen, actualiza las filas con valores distintos, inserta las
+    nuevas y reordena con una sola llamada. Los iid no cambian, así que la selección y el
+    scroll se conservan.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.iid_por_clave = {}
+        self.valores = {}
+
+    def limpiar(self):
+        self.sincronizar([])
+
+    def sincronizar(self, filas):
+        tree = self.tree
+        orden = []
+        vistas = set()
+        for clave, valores in filas:
+            if clave in vistas:
+                continue
+            vistas.add(clave)
+            valores = tuple(valores)
+            iid = self.iid_por_clave.get(clave)
+            if iid is None:
+                iid = tree.insert("", "end", values=valores)
+                self.iid_por_clave[clave] = iid
+            elif self.valores[clave] != valores:
+                tree.item(iid, values=valores)
+            self.valores[clave] = valores
+            orden.append(iid)
+
+        quitar = [k for k in self.iid_por_clave if k not in vistas]
+        if quitar:
+            tree.delete(*[self.iid_por_clave.pop(k) for k in quitar])
+            for k in quitar:
+                del self.valores[k]
+        if list(tree.get_children()) != orden:
+            tree.set_children("", *orden)
+
 # ---------- Proveedores ----------
 class VentanaProveedores(tk.Toplevel):
     def __init__(self, master):
@@ -32,6 +92,7 @@ class VentanaProveedores(tk.Toplevel):
         self.tree.heading("nombre", text="Nombre");   self.tree.column("nombre",  width=280)
         self.tree.heading("telefono", text="Teléfono"); self.tree.column("telefono", width=180)
         self.tree.pack(fill="both", expand=True, padx=6, pady=6)
+        self.sync = SincronizadorTabla(self.tree)
 
         ttk.Button(frm, text="Refrescar", command=self.refrescar).pack(pady=6)
         self.refrescar()
@@ -83,10 +144,13 @@ class VentanaProveedores(tk.Toplevel):
             messagebox.showerror("Error", str(e))
 
     def refrescar(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for r in listar_proveedores():
-            self.tree.insert("", "end", values=(r.get("nombre",""), r.get("telefono","")))
+        self.sync.sincronizar(
+            (r["id"], (r.get("nombre",""), r.get("telefono","") or "")) for r in listar_proveedores()
+        )
+
+    def aplicar_cambios(self, cambios):
+        if "proveedores" in cambios:
+            self.refrescar()
 
 
 # ---------- Productos ----------
@@ -134,6 +198,7 @@ class VentanaProductos(tk.Toplevel):
             self.tree.heading(c, text=h); self.tree.column(c, width=w)
         self.tree.grid(row=r, column=0, columnspan=2, sticky="nsew", padx=6, pady=6)
         frm.grid_rowconfigure(r, weight=1); frm.grid_columnconfigure(1, weight=1)
+        self.sync = SincronizadorTabla(self.tree)
 
         ttk.Button(frm, text="Refrescar", command=self.refrescar).grid(row=r+1, column=0, columnspan=2, pady=6)
 
@@ -177,13 +242,10 @@ class VentanaProductos(tk.Toplevel):
             messagebox.showerror("Error", str(e))
 
     def refrescar(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for p in listar_productos():
-            self.tree.insert(
-                "",
-                "end",
-                values=(
+        self.sync.sincronizar(
+            (
+                p["id"],
+                (
                     (p.get("nombre","") or "").title(),
                     (p.get("categoria","") or "").title(),
                     (p.get("unidad","") or "").title(),
@@ -192,6 +254,12 @@ class VentanaProductos(tk.Toplevel):
                     (p.get("codigo","") or "").upper(),
                 ),
             )
+            for p in listar_productos()
+        )
+
+    def aplicar_cambios(self, cambios):
+        if "productos" in cambios:
+            self.refrescar()
 
 
 # ---------- Recetas ----------
@@ -223,19 +291,25 @@ class VentanaRecetas(tk.Toplevel):
         self.tree.heading("cantidad_base", text="Cant. base (g/pz)")
         self.tree.column("componente", width=260); self.tree.column("cantidad_base", width=140)
         self.tree.pack(fill="both", expand=True, padx=2, pady=6)
+        self.sync = SincronizadorTabla(self.tree)
 
     def refrescar(self):
         self.comp["values"] = [p["nombre"] for p in listar_insumos()]
         self.menu["values"] = [p["nombre"] for p in listar_elaborados()]
-        for i in self.tree.get_children(): self.tree.delete(i)
         m = self.menu.get().strip()
-        if not m: return
+        if not m:
+            self.sync.limpiar()
+            return
         try:
-            for r in obtener_receta(m):
-                self.tree.insert("", "end", values=(r["componente"], r["cantidad_base"]))
+            self.sync.sincronizar(((m, r["componente"]), (r["componente"], r["cantidad_base"]))
+                                  for r in obtener_receta(m))
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def aplicar_cambios(self, cambios):
+        if "recetas" in cambios or "productos" in cambios:
+            self.refrescar()
+
     def agregar(self):
         m = self.menu.get().strip(); c = self.comp.get().strip()
         if not m or not c:
@@ -280,6 +354,17 @@ class VentanaProduccion(tk.Toplevel):
         self.tree.pack(fill="both", expand=True, padx=6, pady=6)
         ttk.Button(frm, text="Calcular consumo", command=self.calcular).pack(pady=6)
 
+        lf = ttk.LabelFrame(frm, text="Orden de producción (varios elaborados en una sola operación)")
+        lf.pack(fill="both", expand=True, padx=6, pady=6)
+        self.orden = ttk.Treeview(lf, columns=("producto","cantidad"), show="headings", height=6)
+        for c,t,w in [("producto","Producto",260),("cantidad","Cantidad (pz)",120)]:
+            self.orden.heading(c, text=t); self.orden.column(c, width=w)
+        self.orden.pack(fill="both", expand=True, padx=6, pady=6)
+        acc = ttk.Frame(lf); acc.pack(fill="x", padx=6, pady=(0,6))
+        ttk.Button(acc, text="Agregar a la orden", command=self.agregar_orden).pack(side="left", padx=4)
+        ttk.Button(acc, text="Quitar seleccionado", command=self.quitar_orden).pack(side="left", padx=4)
+        ttk.Button(acc, text="Registrar orden", command=self.producir_orden).pack(side="right", padx=4)
+
     def calcular(self):
         for i in self.tree.get_children(): self.tree.delete(i)
         m = self.menu.get().strip()
@@ -308,6 +393,40 @@ class VentanaProduccion(tk.Toplevel):
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def agregar_orden(self):
+        m = self.menu.get().strip()
+        if not m:
+            messagebox.showerror("Error","Selecciona un producto elaborado"); return
+        try:
+            q = float(self.cant.get())
+        except:
+            messagebox.showerror("Error","Cantidad inválida"); return
+        if q <= 0:
+            messagebox.showerror("Error","La cantidad a producir debe ser > 0"); return
+        for iid in self.orden.get_children():
+            nombre, actual = self.orden.item(iid, "values")
+            if nombre == m:
+                self.orden.item(iid, values=(m, f"{float(actual) + q:g}"))
+                return
+        self.orden.insert("", "end", values=(m, f"{q:g}"))
+
+    def quitar_orden(self):
+        for iid in self.orden.selection():
+            self.orden.delete(iid)
+
+    def producir_orden(self):
+        items = [(n, float(c)) for n, c in (self.orden.item(i, "values") for i in self.orden.get_children())]
+        if not items:
+            messagebox.showerror("Error","Agrega productos a la orden"); return
+        try:
+            ids = registrar_orden_produccion(items, self.nota.get().strip() or "")
+        except Exception as e:
+            messagebox.showerror("Error", str(e)); return
+        for iid in self.orden.get_children():
+            self.orden.delete(iid)
+        messagebox.showinfo("OK", f"Orden registrada: {len(ids)} producciones (#{ids[0]}–#{ids[-1]})")
+        self.calcular()
+
 
 # ---------- Compras ----------
 class VentanaCompras(tk.Toplevel):
@@ -403,7 +522,52 @@ class VentanaCompras(tk.Toplevel):
 
 
 # ---------- Ventas ----------
+class ReservaTicket:
+    """
+    Stock para el ticket en curso: se lee una vez y lo ya agregado se descuenta
+    en memoria. Se vuelve a leer al cerrar el ticket o si llegan cambios de
+    inventario; registrar_venta vuelve a validar al guardar.
+    """
+    def __init__(self):
+        self._stock = None
+        self.reservado = {}
+
+    def disponible(self, pid):
+        if self._stock is None:
+            self._stock = {int(r["id"]): float(r["stock"]) for r in stock_vendibles()}
+        return self._stock.get(pid, 0.0) - self.reservado.get(pid, 0.0)
+
+    def reservar(self, pid, cant):
+        if cant > self.disponible(pid) + 1e-9:
+            return False
+        self.reservado[pid] = self.reservado.get(pid, 0.0) + cant
+        return True
+
+    def liberar(self, pid, cant):
+        resto = self.reservado.get(pid, 0.0) - cant
+        if resto > 1e-9:
+            self.reservado[pid] = resto
+        else:
+            self.reservado.pop(pid, None)
+
+    def recargar(self):
+        """Vuelve a leer el stock en el siguiente uso (p. ej. si otra caja vendió)."""
+        self._stock = None
+
+    def cerrar(self):
+        self._stock = None
+        self.reservado.clear()
+
+
 class VentanaVentas(tk.Toplevel):
+    # Un lector de código de barras "teclea" el código completo en pocos ms.
+    # Si la captura termina sin Enter, se registra sola tras ESCANER_PAUSA_MS sin teclas.
+    ESCANER_MAX_ENTRE_TECLAS_MS = 35
+    ESCANER_PAUSA_MS = 80
+    ESCANER_MIN_CARACTERES = 4
+    BUSQUEDA_PAUSA_MS = 150
+    BUSQUEDA_MAX_RESULTADOS = 50
+
     def __init__(self, master):
         super().__init__(master)
         self.title("Ventas / Merma (Búsqueda)")
@@ -419,6 +583,15 @@ class VentanaVentas(tk.Toplevel):
 
         ttk.Button(row, text="Registrar venta", command=self.registrar).pack(side="right", padx=6)
 
+        scan_box = ttk.LabelFrame(frm, text="Escáner de código de barras")
+        scan_box.pack(fill="x", padx=6, pady=(6,0))
+        ttk.Label(scan_box, text="Código:").pack(side="left", padx=(6,0))
+        self.cod = ttk.Entry(scan_box, width=24); self.cod.pack(side="left", padx=6, pady=4)
+        ttk.Label(scan_box, text="Cantidad:").pack(side="left")
+        self.cant_cod = ttk.Entry(scan_box, width=6); self.cant_cod.insert(0,"1"); self.cant_cod.pack(side="left", padx=6)
+        self.lbl_scan = ttk.Label(scan_box, text="", foreground="#555")
+        self.lbl_scan.pack(side="left", padx=6)
+
         busc_box = ttk.LabelFrame(frm, text="Buscar por código o descripción")
         busc_box.pack(fill="both", padx=6, pady=6)
         top = ttk.Frame(busc_box); top.pack(fill="x")
@@ -445,16 +618,66 @@ class VentanaVentas(tk.Toplevel):
         ttk.Label(frm, text="Solo productos vendibles (Elaborados y Productos); los Insumos NO se venden aquí.").pack(anchor="w", padx=6)
         ttk.Button(actions, text="Borrar seleccionado", command=self.borrar_seleccionado).pack(side="left", padx=4)
 
+        self.cod.bind("<Return>", lambda e: self.add_codigo())
+        self.cod.bind("<KeyPress>", self._tecla_codigo)
         self.q.bind("<Return>", lambda e: self.buscar())
+        self.q.bind("<KeyRelease>", self._programar_busqueda)
         self.cant_busq.bind("<Return>", lambda e: self.add_seleccion())
         self.result.bind("<Double-1>", lambda e: self.add_seleccion())
 
-        self.q.focus_set()
+        self.cod.focus_set()
 
         self.items_by_iid = {}
-    
+        self.iid_por_pid = {}
+        self.resultados_by_iid = {}
+        self.iid_resultado_por_pid = {}
+        self._busq_job = None
+        self._ult_q = None             # última consulta a la BD y sus filas
+        self._ult_filas = []
+        self._ult_completa = False     # True si _ult_filas no se recortó por el límite
+        self.reserva = ReservaTicket()
+        self.indice_codigos = {}
+        self._rafaga = []              # tiempos (ms) de las teclas de la lectura en curso
+        self._rafaga_job = None
+        self._cargar_indice()
+
+    # ------- Escáner -------
+    def _cargar_indice(self):
+        self.indice_codigos = {r["codigo"]: r for r in listar_vendibles() if r.get("codigo")}
+
+    def _resolver_codigo(self, codigo):
+        r = self.indice_codigos.get(codigo)
+        if r is None:
+            # Puede ser un producto dado de alta con la ventana abierta
+            r = buscar_vendible_por_codigo(codigo)
+            if r:
+                self.indice_codigos[codigo] = r
+        return r
+
+    def _tecla_codigo(self, e):
+        if e.keysym in ("Return", "KP_Enter") or not e.char or not e.char.isprintable():
+            return
+        t = e.time
+        if self._rafaga and t - self._rafaga[-1] > self.ESCANER_MAX_ENTRE_TECLAS_MS:
+            self._rafaga = []          # tecleo manual: se espera Enter
+        self._rafaga.append(t)
+        if self._rafaga_job:
+            self.after_cancel(self._rafaga_job)
+            self._rafaga_job = None
+        if len(self._rafaga) >= self.ESCANER_MIN_CARACTERES:
+            self._rafaga_job = self.after(self.ESCANER_PAUSA_MS, self._fin_rafaga)
+
+    def _fin_rafaga(self):
+        self._rafaga_job = None
+        self._rafaga = []
+        if self.cod.get().strip():
+            self.add_codigo()
 
     def add_codigo(self):
+        if self._rafaga_job:
+            self.after_cancel(self._rafaga_job)
+            self._rafaga_job = None
+        self._rafaga = []
         codigo = self.cod.get().strip()
         try:
             cant = float(self.cant_cod.get())
@@ -463,18 +686,20 @@ class VentanaVentas(tk.Toplevel):
         if not codigo:
             messagebox.showerror("Error", "Ingresa un código"); return
 
-        r = buscar_vendible_por_codigo(codigo)
+        r = self._resolver_codigo(codigo)
         if not r:
-            messagebox.showerror("No encontrado", "No hay producto vendible con ese código."); return
+            self.bell()
+            self.lbl_scan.config(text=f"Código no encontrado: {codigo}")
+            self.cod.delete(0, "end")
+            return
 
-        # Validar stock antes de agregar al ticket
-        disp = stock_disponible_producto(r["id"])
-        if cant > disp:
-            messagebox.showerror("Stock insuficiente",
-                                f"Disponible de '{r['nombre']}': {disp:.3f}.\nNo se agregó al ticket.")
+        # Validar stock antes de agregar al ticket (descontando lo que ya lleva)
+        if not self.reserva.reservar(r["id"], cant):
+            self._stock_insuficiente(r)
             return
 
         self._insert_ticket_row(r["id"], r["nombre"], r["codigo"], r["precio"], cant)
+        self.lbl_scan.config(text=f"+{cant:g} {r['nombre']}")
         self.cod.delete(0, "end")
         self.cant_cod.delete(0, "end"); self.cant_cod.insert(0, "1")
 
@@ -493,15 +718,13 @@ class VentanaVentas(tk.Toplevel):
             messagebox.showerror("Error", "Cantidad inválida")
             return
 
-        r = buscar_vendible_por_codigo(codigo)
+        r = self.resultados_by_iid.get(iid) or buscar_vendible_por_codigo(codigo)
         if not r:
             messagebox.showerror("Error", "El código seleccionado ya no es válido")
             return
 
-        disp = stock_disponible_producto(r["id"])
-        if cant > disp:
-            messagebox.showerror("Stock insuficiente",
-                                f"Disponible de '{r['nombre']}': {disp:.3f}.\nNo se agregó al ticket.")
+        if not self.reserva.reservar(r["id"], cant):
+            self._stock_insuficiente(r)
             return
 
         self._insert_ticket_row(r["id"], nombre, r["codigo"], r["precio"], cant)
@@ -511,29 +734,79 @@ class VentanaVentas(tk.Toplevel):
         self.result.selection_remove(iid)
         self.result.focus("")
         self.q.delete(0, "end")           
-        for kid in self.result.get_children():  
-            self.result.delete(kid)
-        self.result.selection_remove(iid)
-        self.result.focus("")
+        self._pintar_resultados([])
 
         self.q.focus_set()
 
-    
+    def _stock_insuficiente(self, r):
+        disp = self.reserva.disponible(r["id"])
+        en_ticket = self.reserva.reservado.get(r["id"], 0.0)
+        extra = f" (ya hay {en_ticket:.3f} en el ticket)" if en_ticket else ""
+        messagebox.showerror("Stock insuficiente",
+                             f"Disponible de '{r['nombre']}': {disp:.3f}{extra}.\nNo se agregó al ticket.")
+
     def _insert_ticket_row(self, pid, nombre, codigo, precio, cantidad):
+        # Lecturas repetidas del mismo producto suman a la línea existente
+        iid = self.iid_por_pid.get(pid)
+        if iid is not None:
+            cantidad += self.items_by_iid[iid][1]
         subtotal = (precio * cantidad) if self.tipo.get()=="VENTA" else 0.0
-        iid = self.tree.insert("", "end", values=(codigo, nombre, cantidad, f"{precio:.2f}", f"{subtotal:.2f}"))
+        valores = (codigo, nombre, f"{cantidad:g}", f"{precio:.2f}", f"{subtotal:.2f}")
+        if iid is None:
+            iid = self.tree.insert("", "end", values=valores)
+            self.iid_por_pid[pid] = iid
+        else:
+            self.tree.item(iid, values=valores)
+        self.tree.see(iid)
         self.items_by_iid[iid] = (pid, cantidad, precio, codigo, nombre)
 
 
+    def _programar_busqueda(self, e=None):
+        if e is not None and e.keysym in ("Return", "KP_Enter", "Up", "Down", "Tab"):
+            return
+        if self._busq_job:
+            self.after_cancel(self._busq_job)
+        self._busq_job = self.after(self.BUSQUEDA_PAUSA_MS, self.buscar)
+
+    def _filas_para(self, q):
+        """Si la consulta extiende a la anterior y aquella vino completa, se filtra en memoria."""
+        ql = q.lower()
+        if self._ult_q is not None and self._ult_completa and ql.startswith(self._ult_q.lower()):
+            return [r for r in self._ult_filas
+                    if ql in r["nombre"].lower() or ql in (r["codigo"] or "").lower()]
+        tope = self.BUSQUEDA_MAX_RESULTADOS
+        filas = buscar_vendibles_por_texto(q, tope + 1)
+        self._ult_q, self._ult_completa = q, len(filas) <= tope
+        self._ult_filas = filas[:tope]
+        return self._ult_filas
+
+    def _pintar_resultados(self, rows):
+        """Actualiza self.result por diferencias: solo inserta/borra lo que cambió."""
+        nuevos = {r["id"] for r in rows}
+        for pid, iid in list(self.iid_resultado_por_pid.items()):
+            if pid not in nuevos:
+                self.result.delete(iid)
+                del self.iid_resultado_por_pid[pid]
+                self.resultados_by_iid.pop(iid, None)
+        for idx, r in enumerate(rows):
+            iid = self.iid_resultado_por_pid.get(r["id"])
+            if iid is None:
+                iid = self.result.insert("", idx, values=(r["codigo"] or "", r["nombre"], f'{r["precio"]:.2f}'))
+                self.iid_resultado_por_pid[r["id"]] = iid
+            elif self.result.index(iid) != idx:
+                self.result.move(iid, "", idx)
+            self.resultados_by_iid[iid] = r
+
     def buscar(self):
+        if self._busq_job:
+            self.after_cancel(self._busq_job)
+            self._busq_job = None
         q = self.q.get().strip()
-        for i in self.result.get_children():
-            self.result.delete(i)
         if not q:
+            self._ult_q = None
+            self._pintar_resultados([])
             return
-        rows = buscar_vendibles_por_texto(q)
-        for r in rows:
-            self.result.insert("", "end", values=(r["codigo"] or "", r["nombre"], f'{r["precio"]:.2f}'))
+        self._pintar_resultados(self._filas_para(q))
         kids = self.result.get_children()
         if kids:
             self.result.selection_set(kids[0])
@@ -549,7 +822,9 @@ class VentanaVentas(tk.Toplevel):
             return
         for iid in sel:
             if iid in self.items_by_iid:
-                del self.items_by_iid[iid]
+                pid, cant = self.items_by_iid.pop(iid)[:2]
+                self.iid_por_pid.pop(pid, None)
+                self.reserva.liberar(pid, cant)
             self.tree.delete(iid)
             
     def registrar(self):
@@ -560,28 +835,28 @@ class VentanaVentas(tk.Toplevel):
         tipo = self.tipo.get()
         nota = self.nota.get().strip() or ""
 
-        faltantes = []
-        for (pid, cant, _precio, _codigo, nombre) in self.items_by_iid.values():
-            disp = stock_disponible_producto(pid) 
-            if cant > disp:
-                faltantes.append((nombre, disp, cant))
-
-        if faltantes:
-            msg = "Stock insuficiente en:\n" + "\n".join(
-                f"• {n}: disponible {d:.3f}, solicitado {c:.3f}" for (n, d, c) in faltantes
-            )
-            messagebox.showerror("Stock insuficiente", msg)
-            return
-
+        # El stock ya se validó al agregar cada línea (ReservaTicket); registrar_venta
+        # descuenta de forma condicional y rechaza el ticket si otra caja ganó el stock.
         payload = [(pid, cant) for (pid, cant, _precio, _codigo, _nombre) in self.items_by_iid.values()]
         try:
             vid = registrar_venta(tipo, payload, None, nota) 
-            self.items_by_iid.clear()
-            for iid in self.tree.get_children():
-                self.tree.delete(iid)
-            messagebox.showinfo("OK", f"{'Merma' if tipo=='MERMA' else 'Venta'} registrada #{vid}")
         except Exception as e:
+            self.reserva.recargar()
             messagebox.showerror("Error", str(e))
+            return
+        self.items_by_iid.clear()
+        self.iid_por_pid.clear()
+        self.reserva.cerrar()
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+        messagebox.showinfo("OK", f"{'Merma' if tipo=='MERMA' else 'Venta'} registrada #{vid}")
+
+    def aplicar_cambios(self, cambios):
+        if "inventario" in cambios:
+            self.reserva.recargar()
+        if "productos" in cambios:
+            self._cargar_indice()
+            self._ult_q = None
 
 
 
@@ -590,26 +865,128 @@ class VentanaInventario(tk.Toplevel):
     def __init__(self, master):
         super().__init__(master)
         self.title("Inventario")
-        cols=("producto","stock","unidad","tipo")
+        cols=("producto","stock","unidad","tipo","costo","valor")
         self.tree = ttk.Treeview(self, columns=cols, show="headings", height=18)
-        headers=["Producto","Stock","Unidad","Tipo"]
-        widths=[260,120,80,140]
+        headers=["Producto","Stock","Unidad","Tipo","Costo unit.","Valor"]
+        widths=[260,120,80,140,100,110]
         for c,h,w in zip(cols,headers,widths):
             self.tree.heading(c, text=h); self.tree.column(c, width=w)
         self.tree.pack(fill="both", expand=True, padx=8, pady=8)
+        self.sync = SincronizadorTabla(self.tree)
+
+        lf = ttk.LabelFrame(self, text="Valuación por categoría")
+        lf.pack(fill="both", padx=8, pady=4)
+        cols=("sucursal","categoria","valor","pct")
+        self.valuacion = ttk.Treeview(lf, columns=cols, show="headings", height=4)
+        for c,h,w in zip(cols, ["Sucursal","Categoría","Valor","% del total"], [160,160,120,100]):
+            self.valuacion.heading(c, text=h); self.valuacion.column(c, width=w)
+        self.valuacion.pack(fill="both", expand=True, padx=6, pady=(6,0))
+        self.sync_valuacion = SincronizadorTabla(self.valuacion)
+        pie = ttk.Frame(lf); pie.pack(fill="x", padx=6, pady=6)
+        self.lbl_valor = ttk.Label(pie, text="Valor total: $0.00")
+        self.lbl_valor.pack(side="left")
+        ttk.Button(pie, text="Exportar valuación (CSV)", command=self.exportar_valuacion).pack(side="right")
+        self._filas_valuacion = []
+
+        lf = ttk.LabelFrame(self, text="Alertas de reorden (consumo últimos 7 / 28 días)")
+        lf.pack(fill="both", padx=8, pady=4)
+        cols=("producto","sucursal","stock","uso7","uso28","cobertura","sugerido","unidad")
+        self.alertas = ttk.Treeview(lf, columns=cols, show="headings", height=6)
+        for c,h,w in zip(cols,
+                         ["Producto","Sucursal","Stock","Uso 7 días","Uso 28 días","Días de cobertura","Pedido sugerido","Unidad"],
+                         [220,120,90,90,90,120,120,80]):
+            self.alertas.heading(c, text=h); self.alertas.column(c, width=w)
+        self.alertas.pack(fill="both", expand=True, padx=6, pady=6)
+        self.sync_alertas = SincronizadorTabla(self.alertas)
+
         ttk.Button(self, text="Refrescar", command=self.refrescar).pack(pady=6)
         self.refrescar()
 
     def refrescar(self):
-        for i in self.tree.get_children(): self.tree.delete(i)
         try:
-            for r in inventario_actual():
-                self.tree.insert("", "end", values=(r["nombre"], f'{r["cantidad"]:.3f}', r["unidad"], r["categoria"]))
+            self._filas_valuacion = valuacion_inventario()
+            self._pintar_valuacion()
+            self._pintar_alertas()
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def aplicar_cambios(self, cambios):
+        """Refresco en vivo: solo se vuelven a valuar los productos tocados desde la última vez."""
+        ids = set(cambios.get("inventario", ())) | set(cambios.get("productos", ()))
+        if not ids:
+            return
+        try:
+            nuevas = valuacion_inventario(sorted(ids))
+            filas = [r for r in self._filas_valuacion if r["producto_id"] not in ids] + nuevas
+            filas.sort(key=lambda r: (r["sucursal"], r["categoria"], r["nombre"]))
+            # Los totales de las filas nuevas son parciales: se recalculan sobre todas, sin redondear
+            por_cat = {}
+            for r in filas:
+                clave = (r["sucursal"], r["categoria"])
+                por_cat[clave] = por_cat.get(clave, 0.0) + r["valor_exacto"]
+            total = round(sum(por_cat.values()), 2)
+            for r in filas:
+                r["valor_categoria"] = round(por_cat[(r["sucursal"], r["categoria"])], 2)
+                r["valor_total"] = total
+            self._filas_valuacion = filas
+            self._pintar_valuacion()
+            if "inventario" in cambios:
+                self._pintar_alertas()
+        except Exception:
+            self.refrescar()   # la valuación parcial falló: se recarga todo
+
+    def _pintar_valuacion(self):
+        categorias = {}
+        filas = []
+        for r in self._filas_valuacion:
+            filas.append(((r["sucursal"], r["producto_id"]),
+                          (r["nombre"], f'{r["cantidad"]:.3f}', r["unidad"], r["categoria"],
+                           f'{r["costo_unitario"]:.2f}', f'{r["valor"]:.2f}')))
+            categorias[(r["sucursal"], r["categoria"])] = r["valor_categoria"]
+        self.sync.sincronizar(filas)
+        total = self._filas_valuacion[0]["valor_total"] if self._filas_valuacion else 0.0
+        self.sync_valuacion.sincronizar(
+            ((suc, cat), (suc, cat, f"{valor:.2f}", f"{(valor / total * 100.0) if total else 0.0:.1f}%"))
+            for (suc, cat), valor in categorias.items()
+        )
+        self.lbl_valor.config(text=f"Valor total: ${total:,.2f}")
+
+    def _pintar_alertas(self):
+        self.sync_alertas.sincronizar(
+            ((a["sucursal_id"], a["producto_id"]),
+             (a["nombre"], a["sucursal"], f'{a["stock"]:.3f}', f'{a["uso_7d"]:.3f}', f'{a["uso_28d"]:.3f}',
+              f'{a["dias_cobertura"]:.1f}', f'{a["sugerido"]:.3f}', a["unidad"]))
+            for a in alertas_reorden()
+        )
+
+    def exportar_valuacion(self):
+        if not self._filas_valuacion:
+            messagebox.showwarning("Atención","No hay inventario para exportar.")
+            return
+        ruta = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV","*.csv")],
+            title="Guardar valuación como CSV"
+        )
+        if not ruta:
+            return
+        try:
+            with open(ruta, "w", newline="", encoding="utf-8-sig") as f:
+                w = csv.writer(f)
+                w.writerow(["Sucursal","Categoría","Producto","Unidad","Stock","Costo unit.","Valor","Valor categoría"])
+                for r in self._filas_valuacion:
+                    w.writerow([r["sucursal"], r["categoria"], r["nombre"], r["unidad"], f'{r["cantidad"]:.3f}',
+                                f'{r["costo_unitario"]:.4f}', f'{r["valor"]:.2f}', f'{r["valor_categoria"]:.2f}'])
+                w.writerow(["", "", "TOTAL", "", "", "", f'{self._filas_valuacion[0]["valor_total"]:.2f}', ""])
+            messagebox.showinfo("OK", f"CSV guardado en:\n{ruta}")
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo guardar el CSV:\n{e}")
+
 
 # ---------- Reportes ----------
+CALOR_COLORES = ("#FFFFFF", "#FFF4D6", "#FFE0A3", "#FFC56B", "#FF9F43")
+PIVOTE_FILAS = {"Producto": "producto", "Categoría": "categoria", "Hora": "hora", "Fecha": "fecha", "Mes": "mes"}
+
 class VentanaReportes(tk.Toplevel):
     def __init__(self, master):
         super().__init__(master)
@@ -630,6 +1007,9 @@ class VentanaReportes(tk.Toplevel):
         self.btn_prov_clear = ttk.Button(top, text="Limpiar", command=self._limpiar_prov, state="disabled")
         self.btn_prov_clear.pack(side="left", padx=2)
 
+        ttk.Label(top, text="Producto:").pack(side="left", padx=(10,2))
+        self.cb_prod = ttk.Combobox(top, values=["(Todos)"] + [p["nombre"] for p in listar_vendibles()], width=22, state="readonly")
+        self.cb_prod.set("(Todos)"); self.cb_prod.pack(side="left")
 
         btns = ttk.Frame(self); btns.pack(fill="x", padx=8, pady=4)
         ttk.Button(btns, text="Ventas DETALLADO", command=self.rp_ventas_det).pack(side="left", padx=4)
@@ -637,8 +1017,18 @@ class VentanaReportes(tk.Toplevel):
         ttk.Button(btns, text="Compras DETALLADO", command=self.rp_compras_det).pack(side="left", padx=4) 
         ttk.Button(btns, text="Ganancias DETALLADO", command=self.rp_ganancias).pack(side="left", padx=4)
         ttk.Button(btns, text="Top productos", command=self.rp_top).pack(side="left", padx=4)
+        self.cb_pivote = ttk.Combobox(btns, values=list(PIVOTE_FILAS), width=10, state="readonly")
+        self.cb_pivote.set("Producto"); self.cb_pivote.pack(side="left", padx=(12,2))
+        ttk.Button(btns, text="Pivote por día", command=self.rp_pivote).pack(side="left", padx=4)
+        ttk.Button(btns, text="Mapa de calor", command=self.rp_heatmap).pack(side="left", padx=4)
+        ttk.Button(btns, text="Resumen diario", command=self.rp_resumen).pack(side="left", padx=4)
+        ttk.Button(btns, text="Corte del día", command=self.corte_dia).pack(side="left", padx=4)
+        ttk.Button(btns, text="Verificar cortes", command=self.rp_verificar_cortes).pack(side="left", padx=4)
         ttk.Button(btns, text="Exportar Excel", command=self.exportar_csv).pack(side="right", padx=4)
 
+        self.barra = ttk.Progressbar(self, mode="determinate", maximum=1, value=0)
+        self.barra.pack(fill="x", padx=8)
+
         cols = ("c1","c2","c3","c4","c5","c6","c7","c8","c9") 
         self.tree = ttk.Treeview(self, columns=cols, show="headings", height=18)
         for c in cols:
@@ -646,10 +1036,14 @@ class VentanaReportes(tk.Toplevel):
             self.tree.column(c, width=160)
         self.tree.pack(fill="both", expand=True, padx=8, pady=8)
         self.tree.tag_configure("total", font=("Segoe UI", 10, "bold"), background="#F5FBFE")
+        for nivel, color in enumerate(CALOR_COLORES):
+            self.tree.tag_configure(f"calor{nivel}", background=color)
         self._headers_actuales = []  
+        self._gen_reporte = 0
 
     def _clear(self, headers):
         self._headers_actuales = headers[:]
+        self._gen_reporte += 1
         for i in self.tree.get_children():
             self.tree.delete(i)
 
@@ -701,15 +1095,65 @@ class VentanaReportes(tk.Toplevel):
 
 
 
+    def _en_segundo_plano(self, fn, args, pintar, con_progreso=False):
+        """
+        Corre fn(*args) en un hilo aparte (los reportes usan conexión de solo lectura)
+        y pinta el resultado en el hilo de Tk. Si se pide otro reporte antes, este se descarta.
+        Con con_progreso=True, fn recibe progreso=(hechos, total) y se mueve la barra.
+        """
+        gen = self._gen_reporte
+        res = {}
+        self.barra.config(maximum=1, value=0)
+
+        def trabajo():
+            try:
+                if con_progreso:
+                    res["rows"] = fn(*args, progreso=lambda h, t: res.__setitem__("avance", (h, t)))
+                else:
+                    res["rows"] = fn(*args)
+            except Exception as e:
+                res["error"] = e
+
+        hilo = threading.Thread(target=trabajo, daemon=True)
+        hilo.start()
+        self.config(cursor="watch")
+
+        def revisar():
+            if gen == self._gen_reporte and "avance" in res:
+                hechos, total = res["avance"]
+                self.barra.config(maximum=total, value=hechos)
+            if hilo.is_alive():
+                self.after(50, revisar)
+                return
+            if gen != self._gen_reporte:
+                return
+            self.config(cursor="")
+            self.barra.config(maximum=1, value=0)
+            if "error" in res:
+                messagebox.showerror("Error", str(res["error"]))
+                return
+            try:
+                pintar(res["rows"])
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+
+        self.after(50, revisar)
+
+    def _por_tramos(self, reporte, fn, args, pintar, **kwargs):
+        """Reporte largo: por tramos en varios procesos (local) o directo en el servidor."""
+        if SERVIDOR:
+            self._en_segundo_plano(partial(fn, **kwargs), args, pintar)
+        else:
+            self._en_segundo_plano(partial(generar_por_tramos, reporte, **kwargs), args, pintar, con_progreso=True)
+
     def rp_ventas_det(self):
         self._set_prov_filter_active(False)
         d = self.desde.get().strip() or None; h = self.hasta.get().strip() or None
         self._clear(["Fecha","Producto","Unidades vendidas","Precio unit. público","Costo unitario","Total ingresos"])
-        
-        tot_cant = 0.0
-        tot_total = 0.0
-        try:
-            rows = reporte_ventas_detallado(d,h)
+
+        def pintar(rows):
+            tot_cant = 0.0
+            tot_total = 0.0
             for r in rows:
                 q = float(r["cantidad"] or 0)
                 total = float(r["subtotal"] or 0)
@@ -729,17 +1173,16 @@ class VentanaReportes(tk.Toplevel):
                 values=("","","", "", "TOTAL:", f'${tot_total:.2f}'),
                 tags=("total",)
             )
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self._por_tramos("ventas", reporte_ventas_detallado, (d, h), pintar)
 
     def rp_merma_det(self):
         self._set_prov_filter_active(False)
         d = self.desde.get().strip() or None; h = self.hasta.get().strip() or None
         self._clear(["Fecha","Producto","Unidades vendidas","Precio unit. público","Pérdida"])
-        tot_unidades = 0.0
-        tot_perdida = 0.0
-        try:
-            rows = reporte_merma_detallado(d,h)
+
+        def pintar(rows):
+            tot_unidades = 0.0
+            tot_perdida = 0.0
             for r in rows:
                 q = float(r["cantidad"] or 0)
                 perd = float(r["perdida"] or 0)
@@ -758,8 +1201,7 @@ class VentanaReportes(tk.Toplevel):
                 values=("", "TOTAL:", f'{tot_unidades:.2f}', "", f'${tot_perdida:.2f}'),
                 tags=("total",)
             )
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self._por_tramos("merma", reporte_merma_detallado, (d, h), pintar)
 
 
     def rp_compras_det(self):
@@ -771,9 +1213,8 @@ class VentanaReportes(tk.Toplevel):
 
         self._clear(["Fecha","Proveedor","Producto","Unidades compradas","UoM","Costo unitario","Costo total"])
 
-        tot_ct = 0.0
-        try:
-            rows = reporte_compras_detallado(d, h, prov)
+        def pintar(rows):
+            tot_ct = 0.0
             for r in rows:
                 q  = float(r["cantidad"] or 0)
                 cu = float(r["costo_unitario"] or 0)
@@ -788,18 +1229,17 @@ class VentanaReportes(tk.Toplevel):
                 values=("", "TOTAL:", "", "", "", "", f"${tot_ct:.2f}"),
                 tags=("total",)
             )
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self._por_tramos("compras", reporte_compras_detallado, (d, h), pintar, proveedor=prov)
 
 
     def rp_top(self):
         self._set_prov_filter_active(False)
         d = self.desde.get().strip() or None; h = self.hasta.get().strip() or None
         self._clear(["Producto","Unidades vendidas","Ingreso"])
-        tot_cant = 0.0
-        tot_ing  = 0.0
-        try:
-            rows = top_productos(10,d,h)
+
+        def pintar(rows):
+            tot_cant = 0.0
+            tot_ing  = 0.0
             for r in rows:
                 q = float(r["cantidad"] or 0)
                 ing = float(r["ingreso"] or 0)
@@ -809,21 +1249,104 @@ class VentanaReportes(tk.Toplevel):
             self.tree.insert("", "end", values=("TOTAL:", f'{tot_cant:.2f}', f'${tot_ing:.2f}'),
             tags=("total",)
             )
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self._en_segundo_plano(top_productos, (10, d, h), pintar)
             
+    def rp_pivote(self):
+        self._set_prov_filter_active(False)
+        d = self.desde.get().strip() or None; h = self.hasta.get().strip() or None
+        etiqueta = self.cb_pivote.get() or "Producto"
+        self._clear([etiqueta] + list(DIAS_SEMANA) + ["Total"])
+
+        def pintar(res):
+            tot_col = [0.0] * len(res["columnas"])
+            for f, vals in zip(res["filas"], res["valores"]):
+                tot_col = [a + b for a, b in zip(tot_col, vals)]
+                self.tree.insert("", "end", values=[f] + [f"${v:.2f}" for v in vals] + [f"${sum(vals):.2f}"])
+            self.tree.insert("", "end", values=["TOTAL:"] + [f"${v:.2f}" for v in tot_col] + [f"${sum(tot_col):.2f}"],
+                             tags=("total",))
+        # Con servidor, pivote_ventas es remota (el cubo vive en el proceso dueño de la base)
+        self._en_segundo_plano(pivote_ventas, (PIVOTE_FILAS[etiqueta], "dia_semana", "subtotal", d, h), pintar)
+
+    def rp_resumen(self):
+        self._set_prov_filter_active(False)
+        d = self.desde.get().strip() or None; h = self.hasta.get().strip() or None
+        self._clear(["Fecha","Concepto","Operaciones","Cantidad","Importe","Costo","Estado"])
+
+        def pintar(rows):
+            totales = {}
+            for r in rows:
+                self.tree.insert("", "end", values=(
+                    r["dia"], r["concepto"], r["operaciones"], f'{r["cantidad"]:.2f}',
+                    f'{r["importe"]:.2f}', f'{r["costo"]:.2f}', "Cerrado" if r["cerrado"] else "Abierto"))
+                totales[r["concepto"]] = totales.get(r["concepto"], 0.0) + r["importe"]
+            for concepto, importe in totales.items():
+                self.tree.insert("", "end", values=("TOTAL:", concepto, "", "", f"${importe:.2f}", "", ""),
+                                 tags=("total",))
+        self._en_segundo_plano(resumen_diario, (d, h), pintar)
+
+    def rp_verificar_cortes(self):
+        """Recalcula el checksum de los días cerrados del rango (lee todas sus filas)."""
+        self._set_prov_filter_active(False)
+        d = self.desde.get().strip() or None; h = self.hasta.get().strip() or None
+        self._clear(["Fecha","Filas en el corte","Filas actuales","Estado"])
+
+        def pintar(alterados):
+            for a in alterados:
+                self.tree.insert("", "end", values=(a["dia"], a["filas_corte"], a["filas_actuales"], "ALTERADO"))
+            if alterados:
+                messagebox.showwarning("Cortes alterados",
+                    "Hubo cambios después del corte en:\n" + "\n".join(a["dia"] for a in alterados))
+            else:
+                messagebox.showinfo("Cortes", "Todos los cortes del rango coinciden.")
+        self._en_segundo_plano(verificar_cortes, (d, h), pintar)
+
+    def corte_dia(self):
+        dia = self.hasta.get().strip() or None
+        etiqueta = dia or "ayer"
+        if not messagebox.askyesno("Corte del día", f"¿Cerrar el día ({etiqueta})? Sus totales quedarán congelados."):
+            return
+        try:
+            res = cerrar_dia(dia)
+        except Exception as e:
+            messagebox.showerror("Error", str(e)); return
+        t = res["totales"]
+        messagebox.showinfo("Corte registrado",
+            f'Día {res["dia"]} cerrado ({res["filas"]} registros).\n'
+            f'Ventas: ${t.get("VENTA", 0):.2f}   Merma: ${t.get("MERMA", 0):.2f}   Compras: ${t.get("COMPRA", 0):.2f}')
+        self.rp_resumen()
+
+    def rp_heatmap(self):
+        self._set_prov_filter_active(False)
+        d = self.desde.get().strip() or None; h = self.hasta.get().strip() or None
+        prod = self.cb_prod.get().strip()
+        prod = None if prod in ("", "(Todos)") else prod
+        self._clear(["Hora"] + list(DIAS_SEMANA) + ["Total"])
+
+        def pintar(rows):
+            maximo = max((r["total"] for r in rows), default=0.0)
+            tot_dias = [0.0] * 7
+            for r in rows:
+                tot_dias = [a + b for a, b in zip(tot_dias, r["dias"])]
+                # Intensidad por fila (Treeview no colorea celdas individuales)
+                nivel = 0 if maximo <= 0 else min(len(CALOR_COLORES) - 1, int(r["total"] / maximo * len(CALOR_COLORES)))
+                self.tree.insert("", "end",
+                    values=[f'{r["hora"]:02d}:00'] + [f"${v:.2f}" for v in r["dias"]] + [f'${r["total"]:.2f}'],
+                    tags=(f"calor{nivel}",))
+            self.tree.insert("", "end", values=["TOTAL:"] + [f"${v:.2f}" for v in tot_dias] + [f"${sum(tot_dias):.2f}"],
+                             tags=("total",))
+        self._en_segundo_plano(reporte_heatmap, (d, h, prod), pintar)
+
     def rp_ganancias(self):
         d = self.desde.get().strip() or None
         h = self.hasta.get().strip() or None
 
         self._clear(["Fecha","Producto","Cantidad","Precio unit. público","Total ingreso","Costo unit.","Margen unit.","Margen total","% Margen"])
 
-        tot_ingreso = 0.0
-        tot_costo   = 0.0
-        tot_margen  = 0.0
+        def pintar(rows):
+            tot_ingreso = 0.0
+            tot_costo   = 0.0
+            tot_margen  = 0.0
 
-        try:
-            rows = reporte_ventas_detallado(d, h)
             for r in rows:
                 cantidad = float(r["cantidad"])
                 precio_u = float(r["precio_unitario"])
@@ -871,9 +1394,7 @@ class VentanaReportes(tk.Toplevel):
                 self.tree.tag_configure("total", background=PALETTE.get("total_bg", "#F5FBFE"))
             except:
                 pass
-
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self._por_tramos("ventas", reporte_ventas_detallado, (d, h), pintar)
 
 
     def exportar_csv(self):
@@ -1030,6 +1551,8 @@ def apply_theme(root: tk.Tk, mode: str = None):
     
 # ---------- Main ---------
 class MainApp(tk.Tk):
+    VIGILANCIA_MS = 1000   # cada cuánto se buscan cambios para refrescar las ventanas abiertas
+
     def __init__(self):
         super().__init__()
         self.title("Cafetería Alé Alí— Inventario y Ventas")
@@ -1039,8 +1562,66 @@ class MainApp(tk.Tk):
         apply_theme(self, self.modo_inicial)
   
         
-        self._verificar_bd()
+        if not SERVIDOR:
+            self._verificar_bd()
+            if RESPALDO_HORAS > 0:
+                self.respaldo = RespaldoProgramado(RESPALDO_HORAS)
+                self.respaldo.start()
         self._menu_principal()
+        self._iniciar_vigilancia()
+
+    def _iniciar_vigilancia(self):
+        # En local, PRAGMA data_version (ve commits de otros procesos); con servidor, cambios_desde
+        try:
+            if SERVIDOR:
+                self.vigilante = None
+                self._version_cambios = version_cambios()
+            else:
+                self.vigilante = VigilanteCambios()
+        except Exception:
+            return
+        self.after(self.VIGILANCIA_MS, self._vigilar)
+
+    def _vigilar(self):
+        if self.vigilante is not None:
+            try:
+                cambios = self.vigilante.revisar()
+            except Exception:
+                cambios = {}
+            self._repartir_cambios(cambios)
+            self.after(self.VIGILANCIA_MS, self._vigilar)
+            return
+
+        # Con servidor la consulta es HTTP: se hace en un hilo para no congelar Tk,
+        # y no se lanza la siguiente hasta que termine esta
+        res = {}
+
+        def trabajo():
+            try:
+                res["r"] = cambios_desde(self._version_cambios)
+            except Exception:
+                pass
+
+        hilo = threading.Thread(target=trabajo, daemon=True)
+        hilo.start()
+
+        def revisar():
+            if hilo.is_alive():
+                self.after(50, revisar)
+                return
+            if "r" in res:
+                self._version_cambios = res["r"]["version"]
+                self._repartir_cambios(res["r"]["cambios"])
+            self.after(self.VIGILANCIA_MS, self._vigilar)
+
+        self.after(50, revisar)
+
+    def _repartir_cambios(self, cambios):
+        if not cambios:
+            return
+        for w in self.winfo_children():
+            if isinstance(w, tk.Toplevel) and hasattr(w, "aplicar_cambios"):
+                w.aplicar_cambios(cambios)
 
     def _verificar_bd(self):
         with conectar() as conn:
@@ -1095,4 +1676,6 @@ class MainApp(tk.Tk):
 
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()   # los reportes por tramos usan procesos (ver paralelo.py)
     MainApp().mainloop()
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+Archivado de movimientos_inventario por mes.
+
+Los periodos cerrados se mueven a archivos SQLite mensuales (archivo/movs_YYYY-MM.db).
+En la base viva queda un movimiento SALDO_INICIAL por producto/sucursal con la suma
+de lo archivado, así SUM(movimientos) sigue cuadrando con inventario.
+
+Uso:  python archivo.py archivar 2025-06
+      python archivo.py compactar
+"""
+import argparse
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import db
+
+_COLS = "id, producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota, creado_en"
+
+_DDL_ARCHIVO = """CREATE TABLE IF NOT EXISTS movimientos_inventario(
+    id INTEGER PRIMARY KEY,
+    producto_id INTEGER NOT NULL,
+    sucursal_id INTEGER NOT NULL,
+    cantidad_base REAL NOT NULL,
+    motivo TEXT NOT NULL,
+    ref_tabla TEXT,
+    ref_id INTEGER,
+    nota TEXT,
+    creado_en TEXT NOT NULL
+)"""
+
+
+def dir_archivo() -> Path:
+    return db.DB_PATH.parent / "archivo"
+
+
+def _ruta_periodo(periodo: str) -> Path:
+    return dir_archivo() / f"movs_{periodo}.db"
+
+
+def _siguiente_mes(periodo: str) -> str:
+    y, m = int(periodo[:4]), int(periodo[5:7])
+    y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return f"{y:04d}-{m:02d}"
+
+
+def _validar_periodo(periodo: str):
+    if not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", periodo or ""):
+        raise ValueError("El periodo debe tener formato YYYY-MM")
+    if periodo >= datetime.now().strftime("%Y-%m"):
+        raise ValueError("Solo se pueden archivar meses ya cerrados")
+
+
+def archivar_hasta(periodo: str, nota: str = "Saldo archivado") -> Dict[str, int]:
+    """
+    Archiva todos los movimientos con fecha anterior al mes siguiente a `periodo`.
+    Devuelve {periodo: filas_archivadas}.
+    """
+    _validar_periodo(periodo)
+    corte = f"{_siguiente_mes(periodo)}-01 00:00:00"
+    corte_ts = db._ts_dia(corte)
+    dir_archivo().mkdir(parents=True, exist_ok=True)
+
+    with db.conectar() as conn:
+        meses = [
+            r["mes"] for r in conn.execute(
+                """SELECT DISTINCT substr(creado_en, 1, 7) AS mes
+                   FROM movimientos_inventario WHERE creado_ts < ? ORDER BY mes""",
+                (corte_ts,),
+            ).fetchall()
+        ]
+    if not meses:
+        return {}
+
+    # 1) Copiar a los archivos mensuales (idempotente: INSERT OR IGNORE por id)
+    for mes in meses:
+        ruta = _ruta_periodo(mes)
+        with db.conectar() as conn:
+            conn.execute("ATTACH DATABASE ? AS arch", (str(ruta),))
+            try:
+                conn.execute(_DDL_ARCHIVO.replace("movimientos_inventario", "arch.movimientos_inventario", 1))
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS arch.idx_arch_prod ON movimientos_inventario(producto_id, sucursal_id)"
+                )
+                conn.execute(
+                    f"""INSERT OR IGNORE INTO arch.movimientos_inventario({_COLS})
+                        SELECT {_COLS} FROM main.movimientos_inventario
+                        WHERE creado_ts >= ? AND creado_ts < ?""",
+                    (db._ts_dia(f"{mes}-01"), db._ts_dia(f"{_siguiente_mes(mes)}-01")),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE arch")
+
+    # 2) En la base viva: saldo arrastrado + borrado, en una sola transacción
+    resumen = {}
+    with db.tx(modo="IMMEDIATE") as conn:
+        for mes in meses:
+            n = conn.execute(
+                "SELECT COUNT(*) AS n FROM movimientos_inventario WHERE creado_ts >= ? AND creado_ts < ?",
+                (db._ts_dia(f"{mes}-01"), db._ts_dia(f"{_siguiente_mes(mes)}-01")),
+            ).fetchone()["n"]
+            resumen[mes] = n
+        saldos = conn.execute(
+            """SELECT producto_id, sucursal_id, SUM(cantidad_base) AS total
+               FROM movimientos_inventario WHERE creado_ts < ?
+               GROUP BY producto_id, sucursal_id""",
+            (corte_ts,),
+        ).fetchall()
+        conn.execute("DELETE FROM movimientos_inventario WHERE creado_ts < ?", (corte_ts,))
+        conn.executemany(
+            """INSERT INTO movimientos_inventario(producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota, creado_ts, creado_en)
+               VALUES(?,?,?,?,?,?,?,?,?)""",
+            [
+                (s["producto_id"], s["sucursal_id"], s["total"], db.SALDO_INICIAL, "archivos_movimientos", None, nota,
+                 corte_ts, corte)
+                for s in saldos if abs(s["total"] or 0.0) > 1e-9
+            ],
+        )
+        for mes, n in resumen.items():
+            conn.execute(
+                """INSERT INTO archivos_movimientos(periodo, ruta, filas, archivado_en) VALUES(?,?,?,?)
+                   ON CONFLICT(periodo) DO UPDATE SET filas = filas + excluded.filas, archivado_en = excluded.archivado_en""",
+                (mes, _ruta_periodo(mes).name, n, db._now_str()),
+            )
+        # Los ids del libro cambiaron: la próxima conciliación debe ser completa
+        conn.execute("DELETE FROM conciliacion_estado")
+        conn.execute("DELETE FROM saldos_libro")
+    return resumen
+
+
+def periodos_archivados() -> List[Dict]:
+    with db.conectar() as conn:
+        rows = conn.execute("SELECT periodo, ruta, filas, archivado_en FROM archivos_movimientos ORDER BY periodo").fetchall()
+        return [dict(r) for r in rows]
+
+
+def movimientos_historicos(
+    desde: Optional[str] = None, hasta: Optional[str] = None, producto_id: Optional[int] = None
+) -> List[Dict]:
+    """
+    Movimientos originales (archivados + vivos) en orden cronológico.
+    Los SALDO_INICIAL se omiten porque solo resumen filas que aquí sí aparecen.
+    """
+    comunes = ["motivo <> ?"]
+    params_comunes: list = [db.SALDO_INICIAL]
+    if producto_id is not None:
+        comunes.append("producto_id=?"); params_comunes.append(producto_id)
+    # Los archivos pueden venir de antes de creado_ts: ahí se filtra por el texto de creado_en
+    where, params = list(comunes), list(params_comunes)
+    if desde:
+        where.append("date(creado_en)>=date(?)"); params.append(desde)
+    if hasta:
+        where.append("date(creado_en)<=date(?)"); params.append(hasta)
+    where_sql = " AND ".join(where)
+    # En la base viva, rango sargable sobre el índice de creado_ts
+    where_ts, params_ts = db._filtro_ts("creado_ts", desde, hasta)
+    where_vivo = " AND ".join(comunes + where_ts)
+    params_vivo = tuple(params_comunes + params_ts)
+
+    out: List[Dict] = []
+    with db.conectar() as conn:
+        periodos = [r["periodo"] for r in conn.execute("SELECT periodo FROM archivos_movimientos ORDER BY periodo")]
+        for mes in periodos:
+            if (desde and mes < desde[:7]) or (hasta and mes > hasta[:7]):
+                continue
+            ruta = _ruta_periodo(mes)
+            if not ruta.exists():
+                raise ValueError(f"Falta el archivo del periodo {mes}: {ruta}")
+            # Un archivo a la vez: evita el límite de bases adjuntas de SQLite
+            conn.execute("ATTACH DATABASE ? AS arch", (str(ruta),))
+            try:
+                rows = conn.execute(
+                    f"SELECT {_COLS} FROM arch.movimientos_inventario WHERE {where_sql} ORDER BY creado_en, id",
+                    tuple(params),
+                ).fetchall()
+                out.extend(dict(r) for r in rows)
+            finally:
+                conn.execute("DETACH DATABASE arch")
+        rows = conn.execute(
+            f"SELECT {_COLS} FROM main.movimientos_inventario WHERE {where_vivo} ORDER BY creado_ts, id",
+            params_vivo,
+        ).fetchall()
+        out.extend(dict(r) for r in rows)
+    return out
+
+
+def compactar() -> Dict[str, int]:
+    """Checkpoint del WAL y VACUUM de la base viva. Devuelve tamaño antes/después en bytes."""
+    antes = db.DB_PATH.stat().st_size if db.DB_PATH.exists() else 0
+    conn = db.conectar()
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return {"antes": antes, "despues": db.DB_PATH.stat().st_size}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Archivado de movimientos de inventario")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("archivar", help="archiva hasta el mes indicado (YYYY-MM), inclusive")
+    a.add_argument("periodo")
+    a.add_argument("--compactar", action="store_true")
+    sub.add_parser("compactar", help="VACUUM de la base viva")
+    sub.add_parser("listar", help="periodos archivados")
+    ns = ap.parse_args(argv)
+
+    if ns.cmd == "archivar":
+        for mes, n in archivar_hasta(ns.periodo).items():
+            print(f"{mes}: {n} movimientos archivados")
+        if ns.compactar:
+            print(compactar())
+    elif ns.cmd == "compactar":
+        print(compactar())
+    else:
+        for p in periodos_archivados():
+            print(f'{p["periodo"]}  {p["filas"]:>8}  {p["ruta"]}')
+
+
+if __name__ == "__main__":
+    main()
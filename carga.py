@@ -0,0 +1,205 @@
+"""
+Prueba de carga: N cajas simuladas contra una base temporal.
+
+Cada caja (hilo o proceso) repite una mezcla de operaciones reales de db:
+ventas, búsquedas, compras y producciones. Al final se reporta el rendimiento
+(operaciones/s), latencias p50/p99 por operación, errores de bloqueo y rechazos
+por stock, y se verifica la consistencia del stock (conciliación contra el
+libro, sin negativos, capas FIFO = stock).
+
+Uso:  python carga.py [--cajas 8] [--segundos 20] [--procesos]
+"""
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import conciliacion
+import db
+
+# Mezcla de operaciones (peso relativo)
+MEZCLA = {"venta": 70, "busqueda": 20, "compra": 5, "produccion": 5}
+N_INSUMOS = 20
+N_ELABORADOS = 10
+N_PRODUCTOS = 10
+STOCK_INICIAL_PZ = 400
+
+_PALABRAS = ("Pan", "Café", "Té", "Jugo", "Galleta", "Pastel", "Torta", "Agua", "Leche", "Dona")
+
+
+def preparar_bd(ruta: Path, semilla: int = 1):
+    """Crea una base nueva con catálogo, recetas y stock inicial."""
+    rnd = random.Random(semilla)
+    db.DB_PATH = ruta
+    db.iniciar_bd("Carga")
+    insumos = []
+    for i in range(N_INSUMOS):
+        nombre = f"Insumo {i:02d}"
+        db.crear_producto(nombre, "Insumos", rnd.choice(("Kilo", "Gramo")), 0)
+        insumos.append(nombre)
+    compras = [(n, 1_000_000, 1_000) for n in insumos]
+    for i in range(N_PRODUCTOS):
+        nombre = f"{_PALABRAS[i % len(_PALABRAS)]} embotellado {i:02d}"
+        db.crear_producto(nombre, "Productos", "Pieza", rnd.randint(10, 40), f"CARGA-P{i:03d}")
+        compras.append((nombre, STOCK_INICIAL_PZ, STOCK_INICIAL_PZ * 5))
+    db.registrar_compra(compras, None, "carga")
+    elaborados = []
+    for i in range(N_ELABORADOS):
+        nombre = f"{_PALABRAS[i % len(_PALABRAS)]} de la casa {i:02d}"
+        db.crear_producto(nombre, "Elaborados", "Pieza", rnd.randint(20, 80), f"CARGA-E{i:03d}")
+        db.definir_receta_producto(nombre, [(c, rnd.randint(5, 50)) for c in rnd.sample(insumos, 3)])
+        elaborados.append((nombre, STOCK_INICIAL_PZ))
+    db.registrar_orden_produccion(elaborados, "carga")
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(round(p / 100.0 * (len(orden) - 1))))]
+
+
+def _caja(ruta: str, caja: int, segundos: float, semilla: int) -> List[Tuple[str, float, str]]:
+    """Una caja: ejecuta operaciones hasta agotar el tiempo. Devuelve (operación, segundos, resultado)."""
+    db.DB_PATH = Path(ruta)
+    rnd = random.Random(semilla * 1000 + caja)
+    vendibles = db.listar_vendibles()
+    elaborados = [p["nombre"] for p in db.listar_elaborados()]
+    productos = [p["nombre"] for p in vendibles if p["nombre"] not in set(elaborados)]
+    ops, pesos = zip(*MEZCLA.items())
+    out = []
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        op = rnd.choices(ops, pesos)[0]
+        t0 = time.perf_counter()
+        try:
+            if op == "venta":
+                items = [(p["id"], rnd.randint(1, 3)) for p in rnd.sample(vendibles, rnd.randint(1, 4))]
+                db.registrar_venta(db.VENTA, items, None, f"caja {caja}")
+            elif op == "busqueda":
+                db.buscar_vendibles_por_texto(rnd.choice(_PALABRAS)[:rnd.randint(2, 4)], 50)
+            elif op == "compra":
+                db.registrar_compra([(rnd.choice(productos), 20, 100)], None, f"caja {caja}")
+            else:
+                db.registrar_produccion(rnd.choice(elaborados), rnd.randint(5, 20), f"caja {caja}")
+            res = "ok"
+        except ValueError as e:
+            res = "stock" if "insuficiente" in str(e).lower() else "error"
+        except sqlite3.OperationalError as e:
+            res = "bloqueo" if db._es_bloqueo(e) else "error"
+        except Exception:
+            res = "error"
+        out.append((op, time.perf_counter() - t0, res))
+    return out
+
+
+def verificar_consistencia() -> Dict:
+    conc = conciliacion.conciliar(reparar=False, completo=True)
+    with db.lectura() as conn:
+        negativos = conn.execute(
+            "SELECT COUNT(*) AS n FROM inventario WHERE cantidad_base < -1e-9"
+        ).fetchone()["n"]
+        capas = conn.execute(
+            """SELECT COUNT(*) AS n FROM inventario i
+               LEFT JOIN (SELECT producto_id, sucursal_id, SUM(restante_base) AS r
+                          FROM capas_costo GROUP BY producto_id, sucursal_id) k
+                 ON k.producto_id=i.producto_id AND k.sucursal_id=i.sucursal_id
+               WHERE ABS(i.cantidad_base - IFNULL(k.r, 0)) > 1e-6"""
+        ).fetchone()["n"]
+    return {
+        "diferencias_libro": len(conc["diferencias"]),
+        "stock_negativo": negativos,
+        "capas_descuadradas": capas,
+        "ok": not conc["diferencias"] and negativos == 0 and capas == 0,
+    }
+
+
+def correr(cajas: int = 8, segundos: float = 20.0, procesos: bool = False,
+           ruta: Optional[Path] = None, semilla: int = 1) -> Dict:
+    tmp = None
+    if ruta is None:
+        tmp = tempfile.TemporaryDirectory(prefix="carga-")
+        ruta = Path(tmp.name) / "datos.db"
+    original = db.DB_PATH
+    try:
+        preparar_bd(ruta, semilla)
+        t0 = time.perf_counter()
+        if procesos:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=cajas, mp_context=ctx) as pool:
+                partes = list(pool.map(_caja, [str(ruta)] * cajas, range(cajas),
+                                       [segundos] * cajas, [semilla] * cajas))
+        else:
+            partes = [None] * cajas
+
+            def hilo(i):
+                partes[i] = _caja(str(ruta), i, segundos, semilla)
+
+            hilos = [threading.Thread(target=hilo, args=(i,)) for i in range(cajas)]
+            for h in hilos:
+                h.start()
+            for h in hilos:
+                h.join()
+        duracion = time.perf_counter() - t0
+        consistencia = verificar_consistencia()
+    finally:
+        db.DB_PATH = original
+        if tmp:
+            tmp.cleanup()
+
+    registros = [r for parte in partes for r in parte]
+    por_op: Dict[str, Dict] = {}
+    for op in MEZCLA:
+        lat = [s for o, s, _ in registros if o == op]
+        res = [r for o, _, r in registros if o == op]
+        por_op[op] = {
+            "n": len(lat),
+            "p50_ms": round(_percentil(lat, 50) * 1000, 2),
+            "p99_ms": round(_percentil(lat, 99) * 1000, 2),
+            **{k: res.count(k) for k in ("ok", "stock", "bloqueo", "error")},
+        }
+    todas = [s for _, s, _ in registros]
+    return {
+        "cajas": cajas,
+        "modo": "procesos" if procesos else "hilos",
+        "segundos": round(duracion, 2),
+        "operaciones": len(registros),
+        "ops_por_s": round(len(registros) / duracion, 1) if duracion > 0 else 0.0,
+        "p50_ms": round(_percentil(todas, 50) * 1000, 2),
+        "p99_ms": round(_percentil(todas, 99) * 1000, 2),
+        "bloqueos": sum(1 for _, _, r in registros if r == "bloqueo"),
+        "errores": sum(1 for _, _, r in registros if r == "error"),
+        "por_operacion": por_op,
+        "consistencia": consistencia,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Prueba de carga con cajas simuladas")
+    ap.add_argument("--cajas", type=int, default=8)
+    ap.add_argument("--segundos", type=float, default=20.0)
+    ap.add_argument("--procesos", action="store_true", help="una caja por proceso en vez de por hilo")
+    ap.add_argument("--semilla", type=int, default=1)
+    ns = ap.parse_args(argv)
+
+    r = correr(ns.cajas, ns.segundos, ns.procesos, semilla=ns.semilla)
+    print(f'{r["cajas"]} cajas ({r["modo"]}), {r["segundos"]:.1f}s: {r["operaciones"]} operaciones, '
+          f'{r["ops_por_s"]:.1f} ops/s, p50 {r["p50_ms"]:.1f} ms, p99 {r["p99_ms"]:.1f} ms')
+    print(f'{"operación":<12}{"n":>8}{"p50 ms":>10}{"p99 ms":>10}{"ok":>8}{"stock":>8}{"bloqueo":>9}{"error":>7}')
+    for op, s in r["por_operacion"].items():
+        print(f'{op:<12}{s["n"]:>8}{s["p50_ms"]:>10.2f}{s["p99_ms"]:>10.2f}{s["ok"]:>8}{s["stock"]:>8}'
+              f'{s["bloqueo"]:>9}{s["error"]:>7}')
+    c = r["consistencia"]
+    print(f'Consistencia: {"OK" if c["ok"] else "FALLA"} (libro {c["diferencias_libro"]}, '
+          f'negativos {c["stock_negativo"]}, capas {c["capas_descuadradas"]})')
+    return 0 if c["ok"] and r["errores"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
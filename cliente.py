@@ -0,0 +1,57 @@
+"""
+Adaptador delgado para usar servidor.py desde las ventanas de app.py.
+
+Las ventanas llaman funciones de db por nombre (listar_productos, registrar_venta, ...);
+instalar_cliente() reemplaza esos nombres por llamadas remotas con la misma firma.
+"""
+import json
+import urllib.error
+import urllib.request
+
+from servidor import OPERACIONES_ESCRITURA, OPERACIONES_LECTURA
+
+
+class ClienteRemoto:
+    def __init__(self, direccion: str, timeout: float = 30.0):
+        if not direccion.startswith("http"):
+            direccion = "http://" + direccion
+        self.url = direccion.rstrip("/")
+        self.timeout = timeout
+
+    def llamar(self, metodo: str, *args, **kwargs):
+        cuerpo = json.dumps({"metodo": metodo, "args": list(args), "kwargs": kwargs}).encode("utf-8")
+        req = urllib.request.Request(
+            self.url + "/rpc", data=cuerpo, method="POST",
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                datos = json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            datos = json.loads(e.read().decode("utf-8") or "{}")
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"No se pudo conectar con el servidor {self.url}: {e.reason}")
+
+        if datos.get("ok"):
+            return datos.get("resultado")
+        # Los errores de validación llegan como ValueError para que la UI los muestre igual
+        if datos.get("tipo") == "ValueError":
+            raise ValueError(datos.get("error", ""))
+        raise RuntimeError(f"{datos.get('tipo', 'Error')}: {datos.get('error', '')}")
+
+    def __getattr__(self, nombre):
+        if nombre not in OPERACIONES_LECTURA and nombre not in OPERACIONES_ESCRITURA:
+            raise AttributeError(nombre)
+        def _remoto(*args, **kwargs):
+            return self.llamar(nombre, *args, **kwargs)
+        _remoto.__name__ = nombre
+        return _remoto
+
+
+def instalar_cliente(namespace: dict, direccion: str) -> ClienteRemoto:
+    """Sustituye en `namespace` (p. ej. globals() de app.py) las operaciones de db por las remotas."""
+    cli = ClienteRemoto(direccion)
+    for nombre in OPERACIONES_LECTURA | OPERACIONES_ESCRITURA:
+        if nombre in namespace:
+            namespace[nombre] = getattr(cli, nombre)
+    return cli
@@ -0,0 +1,120 @@
+"""
+Conciliación de inventario contra el libro de movimientos.
+
+inventario.cantidad_base es un acumulado que actualizan varias funciones; aquí se
+recalcula desde movimientos_inventario con una sola consulta agrupada y se compara.
+Los saldos del libro se guardan en saldos_libro junto con el último id procesado,
+así la siguiente corrida solo agrega los movimientos nuevos.
+
+Uso:  python conciliacion.py [--reparar] [--completo]
+"""
+import argparse
+from typing import Dict
+
+import db
+
+TOLERANCIA = 1e-6
+
+
+def _acumular_libro(conn, completo: bool):
+    est = conn.execute("SELECT ultimo_mov_id FROM conciliacion_estado WHERE id=1").fetchone()
+    desde_id = 0 if (completo or not est) else est["ultimo_mov_id"]
+    if desde_id == 0:
+        conn.execute("DELETE FROM saldos_libro")
+    hasta_id = conn.execute("SELECT IFNULL(MAX(id), 0) AS m FROM movimientos_inventario").fetchone()["m"]
+    if hasta_id > desde_id:
+        conn.execute(
+            """INSERT INTO saldos_libro(producto_id, sucursal_id, cantidad_base)
+               SELECT producto_id, sucursal_id, SUM(cantidad_base)
+               FROM movimientos_inventario
+               WHERE id > ? AND id <= ?
+               GROUP BY producto_id, sucursal_id
+               ON CONFLICT(producto_id, sucursal_id)
+               DO UPDATE SET cantidad_base = cantidad_base + excluded.cantidad_base""",
+            (desde_id, hasta_id),
+        )
+    conn.execute(
+        """INSERT INTO conciliacion_estado(id, ultimo_mov_id, conciliado_en) VALUES(1,?,?)
+           ON CONFLICT(id) DO UPDATE SET ultimo_mov_id=excluded.ultimo_mov_id, conciliado_en=excluded.conciliado_en""",
+        (hasta_id, db._now_str()),
+    )
+    return desde_id, hasta_id
+
+
+def conciliar(reparar: bool = False, completo: bool = False, tolerancia: float = TOLERANCIA) -> Dict:
+    """
+    Compara inventario contra la suma del libro por producto/sucursal.
+    Con reparar=True deja inventario igual al libro (el libro manda).
+    """
+    with db.tx(modo="IMMEDIATE") as conn:
+        desde_id, hasta_id = _acumular_libro(conn, completo)
+        rows = conn.execute(
+            """SELECT p.nombre, p.unidad, x.producto_id, x.sucursal_id, x.inventario, x.libro, x.existe
+               FROM (
+                   SELECT i.producto_id, i.sucursal_id, i.cantidad_base AS inventario,
+                          IFNULL(s.cantidad_base, 0) AS libro, 1 AS existe
+                   FROM inventario i
+                   LEFT JOIN saldos_libro s ON s.producto_id=i.producto_id AND s.sucursal_id=i.sucursal_id
+                   WHERE ABS(i.cantidad_base - IFNULL(s.cantidad_base, 0)) > ?
+                   UNION ALL
+                   SELECT s.producto_id, s.sucursal_id, 0, s.cantidad_base, 0
+                   FROM saldos_libro s
+                   LEFT JOIN inventario i ON i.producto_id=s.producto_id AND i.sucursal_id=s.sucursal_id
+                   WHERE i.id IS NULL AND ABS(s.cantidad_base) > ?
+               ) x
+               JOIN productos p ON p.id=x.producto_id
+               ORDER BY p.nombre""",
+            (tolerancia, tolerancia),
+        ).fetchall()
+
+        diferencias = [
+            {
+                "producto": r["nombre"],
+                "producto_id": r["producto_id"],
+                "sucursal_id": r["sucursal_id"],
+                "unidad": r["unidad"],
+                "inventario": db.desde_base(r["unidad"], r["inventario"]),
+                "libro": db.desde_base(r["unidad"], r["libro"]),
+                "diferencia": db.desde_base(r["unidad"], r["inventario"] - r["libro"]),
+            }
+            for r in rows
+        ]
+
+        reparadas = 0
+        if reparar and rows:
+            conn.executemany(
+                "UPDATE inventario SET cantidad_base=? WHERE producto_id=? AND sucursal_id=?",
+                [(r["libro"], r["producto_id"], r["sucursal_id"]) for r in rows if r["existe"]],
+            )
+            conn.executemany(
+                "INSERT INTO inventario(producto_id, sucursal_id, cantidad_base) VALUES(?,?,?)",
+                [(r["producto_id"], r["sucursal_id"], r["libro"]) for r in rows if not r["existe"]],
+            )
+            reparadas = len(rows)
+
+    return {
+        "desde_id": desde_id,
+        "hasta_id": hasta_id,
+        "diferencias": diferencias,
+        "reparadas": reparadas,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Conciliación de inventario contra movimientos")
+    ap.add_argument("--reparar", action="store_true", help="corrige inventario con el saldo del libro")
+    ap.add_argument("--completo", action="store_true", help="ignora la marca y recalcula todo el libro")
+    ns = ap.parse_args(argv)
+
+    res = conciliar(reparar=ns.reparar, completo=ns.completo)
+    print(f'Movimientos procesados: ids {res["desde_id"] + 1}..{res["hasta_id"]}')
+    if not res["diferencias"]:
+        print("Inventario conciliado: sin diferencias.")
+    for d in res["diferencias"]:
+        print(f'{d["producto"]:<30} inv {d["inventario"]:>12.3f}  libro {d["libro"]:>12.3f}  dif {d["diferencia"]:>+10.3f} {d["unidad"]}')
+    if res["reparadas"]:
+        print(f'{res["reparadas"]} registros corregidos.')
+
+
+if __name__ == "__main__":
+    main()
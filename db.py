@@ -1,30 +1,286 @@
+import hashlib
+import json
+import random
 import sqlite3
+import time
 from contextlib import contextmanager
+from functools import wraps
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict
-from datetime import datetime
+from typing import Iterator, List, Tuple, Optional, Dict, Set
+from datetime import date, datetime, timedelta
 
 DB_PATH = Path(__file__).resolve().parent / "datos.db"
 SCHEMA_PATH = Path(__file__).resolve().parent / "schema.sql"
 
 VENTA = "VENTA"
 MERMA = "MERMA"
+# Movimiento sintético que resume lo archivado (ver archivo.py)
+SALDO_INICIAL = "SALDO_INICIAL"
 
 CATS_FIJAS = ("Insumos", "Elaborados", "Productos")
 
+# Concurrencia entre cajas: espera de SQLite ante bloqueo y reintentos de transacción
+BUSY_TIMEOUT_S = 5.0
+REINTENTOS_TX = 5
+ESPERA_BASE_S = 0.05
+MODOS_TX = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+# Reorden: ventanas de consumo y días de referencia
+VENTANA_CORTA_DIAS = 7
+VENTANA_LARGA_DIAS = 28
+DIAS_ENTREGA = 2
+DIAS_SEGURIDAD = 1
+DIAS_OBJETIVO = 7
+
+# Filas por viaje al cursor en las variantes iter_* (lectura en flujo, memoria constante)
+ARRAYSIZE = 500
+
+# Costeo: "ULTIMO" usa el último costo de compra; "PROMEDIO" el promedio ponderado
+# móvil por producto/sucursal (inventario.costo_promedio); "FIFO" las capas de
+# capas_costo y el costo guardado en ventas_detalle.costo_total. Las tres se mantienen siempre.
+# El método vigente se guarda en la base (config.metodo_costo) y se carga en _migraciones;
+# METODO_COSTO es solo el valor inicial para bases nuevas. Para cambiarlo: cambiar_metodo_costo.
+METODOS_COSTO = ("ULTIMO", "PROMEDIO", "FIFO")
+METODO_COSTO = "ULTIMO"
+
+# Tablas cuyo cambio anotan los triggers en `cambios` (tabla -> columna que identifica la fila)
+TABLAS_VIGILADAS = {
+    "productos": "id",
+    "proveedores": "id",
+    "inventario": "producto_id",
+    "recetas": "producto_menu_id",
+}
+
+
+# Política de tiempo: creado_ts guarda el instante en segundos Unix (UTC) y es la columna
+# indexada para rangos; creado_en guarda el mismo instante como texto local para mostrar.
+# Los días de negocio son días locales de la computadora de la sucursal: un rango de
+# fechas se convierte una sola vez a [inicio, fin) en segundos con _rango_ts.
+TABLAS_CON_FECHA = ("ventas", "compras", "producciones", "movimientos_inventario")
+
+
+def _ahora() -> Tuple[int, str]:
+    """(segundos Unix, texto local) del mismo instante."""
+    ts = int(time.time())
+    return ts, datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
 
 def _now_str() -> str:
     # Fecha/hora local de la computadora, formato estable para SQLite
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return _ahora()[1]
+
+
+def _ts_dia(dia) -> int:
+    """Segundos Unix de la medianoche local de `dia` (date, datetime o texto 'YYYY-MM-DD...')."""
+    if isinstance(dia, datetime):
+        dia = dia.date()
+    elif not isinstance(dia, date):
+        dia = date.fromisoformat(str(dia)[:10])
+    return int(time.mktime(dia.timetuple()))
+
 
+def _dia_de_ts(ts: int) -> str:
+    return datetime.fromtimestamp(ts).date().isoformat()
 
-def conectar():
-    conn = sqlite3.connect(DB_PATH)
+
+def _rango_ts(desde=None, hasta=None) -> Tuple[Optional[int], Optional[int]]:
+    """[desde, hasta] en días locales (inclusive) -> [inicio, fin) en segundos; None = abierto."""
+    ini = _ts_dia(desde) if desde else None
+    fin = None
+    if hasta:
+        h = hasta.date() if isinstance(hasta, datetime) else hasta
+        h = h if isinstance(h, date) else date.fromisoformat(str(h)[:10])
+        fin = _ts_dia(h + timedelta(days=1))
+    return ini, fin
+
+
+def _filtro_ts(columna: str, desde=None, hasta=None) -> Tuple[List[str], List[int]]:
+    # Condiciones sargables sobre creado_ts para los reportes por rango de fechas
+    ini, fin = _rango_ts(desde, hasta)
+    where, params = [], []
+    if ini is not None:
+        where.append(f"{columna} >= ?"); params.append(ini)
+    if fin is not None:
+        where.append(f"{columna} < ?"); params.append(fin)
+    return where, params
+
+
+def conectar(timeout: Optional[float] = None):
+    t = BUSY_TIMEOUT_S if timeout is None else timeout
+    conn = sqlite3.connect(DB_PATH, timeout=t)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(f"PRAGMA busy_timeout={int(t * 1000)}")
+    return conn
+
+
+def conectar_lectura(timeout: Optional[float] = None):
+    """Conexión de solo lectura (mode=ro + query_only) para reportes."""
+    t = BUSY_TIMEOUT_S if timeout is None else timeout
+    conn = sqlite3.connect(f"{DB_PATH.as_uri()}?mode=ro", uri=True, timeout=t, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute(f"PRAGMA busy_timeout={int(t * 1000)}")
     return conn
 
 
+@contextmanager
+def lectura(conn=None):
+    """
+    Transacción de lectura sobre una foto consistente de la base (WAL).
+    Todas las consultas dentro ven el mismo estado y no bloquean los commits de las cajas.
+    """
+    propio = conn is None
+    if propio:
+        conn = conectar_lectura()
+    abierta = not conn.in_transaction
+    try:
+        if abierta:
+            conn.execute("BEGIN")
+            # La foto se fija con la primera lectura
+            conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        yield conn
+    finally:
+        if abierta:
+            conn.rollback()
+        if propio:
+            conn.close()
+
+
+# ------- Tipos de fila -------
+class Fila:
+    """
+    Fila compacta con __slots__ (sin __dict__ por fila). Se lee como atributo
+    (r.nombre) o como dict (r["nombre"], r.get, keys, dict(r)) para la UI.
+    """
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        # __init__ con un parámetro por campo, generado una vez por clase: asignar
+        # slots por nombre cuesta mucho menos que setattr en un ciclo por fila
+        super().__init_subclass__(**kwargs)
+        campos = cls.__slots__
+        codigo = (f"def __init__(self, {', '.join(f'{c}=None' for c in campos)}):\n"
+                  + "".join(f"    self.{c} = {c}\n" for c in campos))
+        ns: Dict = {}
+        exec(codigo, ns)
+        cls.__init__ = ns["__init__"]
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except (AttributeError, TypeError):
+            raise KeyError(campo) from None
+
+    def __setitem__(self, campo, valor):
+        if campo not in self.__slots__:
+            raise KeyError(campo)
+        setattr(self, campo, valor)
+
+    def get(self, campo, defecto=None):
+        return getattr(self, campo, defecto) if campo in self.__slots__ else defecto
+
+    def keys(self):
+        return self.__slots__
+
+    def values(self):
+        return [getattr(self, c) for c in self.__slots__]
+
+    def items(self):
+        return [(c, getattr(self, c)) for c in self.__slots__]
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __contains__(self, campo):
+        return campo in self.__slots__
+
+    def __eq__(self, otro):
+        if isinstance(otro, Fila):
+            return type(self) is type(otro) and self.values() == otro.values()
+        if isinstance(otro, dict):
+            return dict(self.items()) == otro
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (type(self), tuple(self.values()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{c}={getattr(self, c)!r}' for c in self.__slots__)})"
+
+    def _asdict(self) -> Dict:
+        return dict(self.items())
+
+
+class Proveedor(Fila):
+    __slots__ = ("id", "nombre", "telefono")
+
+
+class Producto(Fila):
+    __slots__ = ("id", "nombre", "unidad", "es_vendible", "precio", "codigo", "categoria")
+
+
+class Insumo(Fila):
+    __slots__ = ("id", "nombre")
+
+
+class Vendible(Fila):
+    __slots__ = ("id", "nombre", "codigo", "precio")
+
+
+class ProductoCompra(Fila):
+    __slots__ = ("id", "nombre", "unidad")
+
+
+class FilaInventario(Fila):
+    __slots__ = ("nombre", "unidad", "cantidad", "costo_unitario", "categoria")
+
+
+class LineaVenta(Fila):
+    __slots__ = ("fecha", "producto", "cantidad", "precio_unitario", "costo_unitario",
+                 "margen_unit", "margen_total", "margen_pct", "subtotal")
+
+
+class LineaMerma(Fila):
+    __slots__ = ("fecha", "producto", "cantidad", "precio_venta", "perdida")
+
+
+class LineaCompra(Fila):
+    __slots__ = ("fecha", "proveedor", "producto", "cantidad", "unidad", "costo_unitario", "costo_total")
+
+
+def _fabrica(tipo):
+    # row_factory de sqlite3: arma la fila directo con los valores, sin pasar por sqlite3.Row
+    return lambda cursor, fila: tipo(*fila)
+
+
+def _iterar(sql: str, params=(), arraysize: int = ARRAYSIZE, tipo=None) -> Iterator:
+    """
+    Genera las filas del cursor de arraysize en arraysize, sin armar la lista completa.
+    Con tipo (subclase de Fila) las filas salen ya como ese tipo; las columnas del
+    SELECT deben venir con los nombres y en el orden de sus __slots__.
+    La conexión de lectura se cierra al agotar el generador (o al cerrarlo antes).
+    """
+    with lectura() as conn:
+        cur = conn.execute(sql, params)
+        if tipo is not None:
+            columnas = tuple(d[0] for d in cur.description)
+            if columnas != tipo.__slots__:
+                raise ValueError(f"Columnas {columnas} no corresponden a {tipo.__name__}{tipo.__slots__}")
+            cur.row_factory = _fabrica(tipo)
+        cur.arraysize = arraysize
+        while True:
+            lote = cur.fetchmany()
+            if not lote:
+                return
+            yield from lote
+
+
 def _col_exists(conn, table: str, col: str) -> bool:
     cur = conn.execute(f"PRAGMA table_info({table})")
     return any(r["name"] == col for r in cur.fetchall())
@@ -85,12 +341,280 @@ def _migraciones(conn):
     conn.execute("CREATE INDEX IF NOT EXISTS idx_prod_cat ON productos(categoria_id)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_inv_prod_suc ON inventario(producto_id, sucursal_id)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_mvto_prod_suc ON movimientos_inventario(producto_id, sucursal_id)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_ventas_tipo_fecha ON ventas(tipo, creado_en)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_vdet_venta ON ventas_detalle(venta_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cdet_compra ON compras_detalle(compra_id)")
+    _migrar_creado_ts(conn)
+
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS archivos_movimientos(
+            periodo TEXT PRIMARY KEY,
+            ruta TEXT NOT NULL,
+            filas INTEGER NOT NULL DEFAULT 0,
+            archivado_en TEXT NOT NULL
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS saldos_libro(
+            producto_id INTEGER NOT NULL,
+            sucursal_id INTEGER NOT NULL,
+            cantidad_base REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY(producto_id, sucursal_id)
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS conciliacion_estado(
+            id INTEGER PRIMARY KEY CHECK(id = 1),
+            ultimo_mov_id INTEGER NOT NULL DEFAULT 0,
+            conciliado_en TEXT
+        )"""
+    )
+
+    # Consumo diario por producto/sucursal, mantenido por trigger en cada movimiento
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS consumo_diario(
+            producto_id INTEGER NOT NULL,
+            sucursal_id INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            cantidad_base REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY(producto_id, sucursal_id, dia)
+        )"""
+    )
+    conn.execute(
+        """CREATE TRIGGER IF NOT EXISTS consumo_despues_movimiento
+           AFTER INSERT ON movimientos_inventario
+           WHEN NEW.motivo IN ('VENTA','MERMA','PRODUCCION') AND NEW.cantidad_base < 0
+           BEGIN
+             INSERT INTO consumo_diario(producto_id, sucursal_id, dia, cantidad_base)
+             VALUES (NEW.producto_id, NEW.sucursal_id, substr(NEW.creado_en, 1, 10), -NEW.cantidad_base)
+             ON CONFLICT(producto_id, sucursal_id, dia)
+             DO UPDATE SET cantidad_base = cantidad_base + excluded.cantidad_base;
+           END"""
+    )
+    _preparar_consumo_diario(conn)
+
+    # Cubetas hora × día para el mapa de calor, llenadas por trigger al vender
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS ventas_por_hora(
+            dia TEXT NOT NULL,
+            hora INTEGER NOT NULL,
+            dia_semana INTEGER NOT NULL,
+            producto_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            cantidad REAL NOT NULL DEFAULT 0,
+            ingreso REAL NOT NULL DEFAULT 0,
+            lineas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(dia, hora, producto_id, tipo)
+        )"""
+    )
+    conn.execute(
+        """CREATE TRIGGER IF NOT EXISTS ventas_hora_despues_detalle
+           AFTER INSERT ON ventas_detalle
+           BEGIN
+             INSERT INTO ventas_por_hora(dia, hora, dia_semana, producto_id, tipo, cantidad, ingreso, lineas)
+             SELECT substr(v.creado_en, 1, 10), CAST(substr(v.creado_en, 12, 2) AS INTEGER),
+                    (CAST(strftime('%w', v.creado_en) AS INTEGER) + 6) % 7,
+                    NEW.producto_id, v.tipo, NEW.cantidad, NEW.subtotal, 1
+             FROM ventas v WHERE v.id = NEW.venta_id
+             ON CONFLICT(dia, hora, producto_id, tipo)
+             DO UPDATE SET cantidad = cantidad + excluded.cantidad,
+                           ingreso = ingreso + excluded.ingreso,
+                           lineas = lineas + 1;
+           END"""
+    )
+    _preparar_ventas_por_hora(conn)
+
+    # Costo promedio ponderado por producto/sucursal; arranca con el último costo conocido
+    if not _col_exists(conn, "inventario", "costo_promedio"):
+        conn.execute("ALTER TABLE inventario ADD COLUMN costo_promedio REAL NOT NULL DEFAULT 0")
+        conn.execute(
+            """UPDATE inventario SET costo_promedio = IFNULL(
+                 (SELECT cd.costo_unitario FROM compras_detalle cd
+                  WHERE cd.producto_id=inventario.producto_id ORDER BY cd.id DESC LIMIT 1),
+                 (SELECT IFNULL(p.costo, 0) FROM productos p WHERE p.id=inventario.producto_id))"""
+        )
+
+    # Capas FIFO: cola de capas abiertas por producto/sucursal (índice parcial)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS capas_costo(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            producto_id INTEGER NOT NULL REFERENCES productos(id),
+            sucursal_id INTEGER NOT NULL REFERENCES sucursales(id),
+            origen TEXT NOT NULL,
+            ref_id INTEGER,
+            cantidad_base REAL NOT NULL,
+            restante_base REAL NOT NULL,
+            costo_base REAL NOT NULL,
+            creado_en TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+        )"""
+    )
+    conn.execute(
+        """CREATE INDEX IF NOT EXISTS idx_capas_abiertas
+           ON capas_costo(producto_id, sucursal_id, id) WHERE restante_base > 0"""
+    )
+    if not _col_exists(conn, "ventas_detalle", "costo_total"):
+        conn.execute("ALTER TABLE ventas_detalle ADD COLUMN costo_total REAL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS config(
+            clave TEXT PRIMARY KEY,
+            valor TEXT NOT NULL
+        )"""
+    )
+    _metodo_costo(conn)
+    _preparar_capas_costo(conn)
+
+    # Corte del día: totales congelados por día y concepto, con checksum de las filas
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS cortes_dia(
+            dia TEXT PRIMARY KEY,
+            cerrado_en TEXT NOT NULL,
+            filas INTEGER NOT NULL,
+            checksum TEXT NOT NULL
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS cortes_dia_totales(
+            dia TEXT NOT NULL REFERENCES cortes_dia(dia) ON DELETE CASCADE,
+            concepto TEXT NOT NULL,
+            operaciones INTEGER NOT NULL,
+            cantidad REAL NOT NULL,
+            importe REAL NOT NULL,
+            costo REAL NOT NULL,
+            PRIMARY KEY(dia, concepto)
+        )"""
+    )
+
+    # Registro de cambios para refresco en vivo: una fila por (tabla, fila) con la última versión
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS cambios(
+            tabla TEXT NOT NULL,
+            fila_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY(tabla, fila_id)
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cambios_version ON cambios(version)")
+    for tabla, columna in TABLAS_VIGILADAS.items():
+        for evento, fila in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            conn.execute(
+                f"""CREATE TRIGGER IF NOT EXISTS cambios_{tabla}_{evento.lower()}
+                   AFTER {evento} ON {tabla}
+                   BEGIN
+                     INSERT INTO cambios(tabla, fila_id, version)
+                     VALUES ('{tabla}', {fila}.{columna}, (SELECT IFNULL(MAX(version), 0) + 1 FROM cambios))
+                     ON CONFLICT(tabla, fila_id) DO UPDATE SET version = excluded.version;
+                   END"""
+            )
 
     _autofill_codigos(conn)
 
 
+def _migrar_creado_ts(conn):
+    """
+    Columna entera creado_ts (segundos Unix) en las tablas con fecha, llenada desde creado_en
+    (texto local), con índices enteros en lugar de los de texto. Un trigger la completa si
+    algún INSERT no la trae.
+    """
+    for tabla in TABLAS_CON_FECHA:
+        if not _col_exists(conn, tabla, "creado_ts"):
+            conn.execute(f"ALTER TABLE {tabla} ADD COLUMN creado_ts INTEGER")
+        conn.execute(
+            f"""UPDATE {tabla} SET creado_ts = CAST(strftime('%s', creado_en, 'utc') AS INTEGER)
+                WHERE creado_ts IS NULL"""
+        )
+        conn.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS {tabla}_creado_ts
+               AFTER INSERT ON {tabla} WHEN NEW.creado_ts IS NULL
+               BEGIN
+                 UPDATE {tabla} SET creado_ts = CAST(strftime('%s', NEW.creado_en, 'utc') AS INTEGER)
+                 WHERE id = NEW.id;
+               END"""
+        )
+    for viejo in ("idx_ventas_tipo_fecha", "idx_ventas_fecha", "idx_compras_fecha",
+                  "idx_producciones_fecha", "idx_mvto_fecha"):
+        conn.execute(f"DROP INDEX IF EXISTS {viejo}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ventas_tipo_ts ON ventas(tipo, creado_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ventas_ts ON ventas(creado_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_compras_ts ON compras(creado_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_producciones_ts ON producciones(creado_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mvto_ts ON movimientos_inventario(creado_ts)")
+
+
+def _preparar_consumo_diario(conn):
+    hoy = _now_str()[:10]
+    # Se conserva el doble de la ventana más larga; lo anterior ya no se usa
+    conn.execute(
+        "DELETE FROM consumo_diario WHERE dia < date(?, ?)", (hoy, f"-{2 * VENTANA_LARGA_DIAS} days")
+    )
+    if conn.execute("SELECT 1 FROM consumo_diario LIMIT 1").fetchone():
+        return
+    # Bases existentes: se carga una sola vez desde el libro (solo la ventana larga)
+    conn.execute(
+        """INSERT INTO consumo_diario(producto_id, sucursal_id, dia, cantidad_base)
+           SELECT producto_id, sucursal_id, substr(creado_en, 1, 10), -SUM(cantidad_base)
+           FROM movimientos_inventario
+           WHERE creado_ts >= ?
+             AND motivo IN ('VENTA','MERMA','PRODUCCION') AND cantidad_base < 0
+           GROUP BY producto_id, sucursal_id, substr(creado_en, 1, 10)""",
+        (_ts_dia(date.fromisoformat(hoy) - timedelta(days=VENTANA_LARGA_DIAS - 1)),),
+    )
+
+
+def _metodo_costo(conn) -> str:
+    """Método de costeo guardado en la base; lo deja en METODO_COSTO. Una base nueva guarda el actual."""
+    global METODO_COSTO
+    r = conn.execute("SELECT valor FROM config WHERE clave='metodo_costo'").fetchone()
+    if r is None:
+        if METODO_COSTO not in METODOS_COSTO:
+            raise ValueError(f"METODO_COSTO debe ser uno de {METODOS_COSTO}")
+        conn.execute("INSERT INTO config(clave, valor) VALUES ('metodo_costo', ?)", (METODO_COSTO,))
+    else:
+        METODO_COSTO = r["valor"]
+    return METODO_COSTO
+
+
+def _preparar_capas_costo(conn):
+    # Bases existentes: una capa de saldo por producto con el stock y costo actuales.
+    # Los Elaborados (sin costo de compra) llevan el costo de su receta.
+    if conn.execute("SELECT 1 FROM capas_costo LIMIT 1").fetchone():
+        return
+    conn.execute(
+        """INSERT INTO capas_costo(producto_id, sucursal_id, origen, cantidad_base, restante_base, costo_base, creado_en)
+           SELECT i.producto_id, i.sucursal_id, 'SALDO', i.cantidad_base, i.cantidad_base,
+                  IFNULL(NULLIF(i.costo_promedio, 0), IFNULL(p.costo, 0))
+                    / (CASE p.unidad WHEN 'Kilo' THEN 1000.0 ELSE 1.0 END),
+                  ?
+           FROM inventario i
+           JOIN productos p ON p.id=i.producto_id
+           LEFT JOIN categorias c ON c.id=p.categoria_id
+           WHERE i.cantidad_base > 0 AND IFNULL(c.nombre, '') <> 'Elaborados'""",
+        (_now_str(),),
+    )
+    elaborados = conn.execute(
+        """SELECT i.producto_id, i.sucursal_id, i.cantidad_base, p.unidad
+           FROM inventario i
+           JOIN productos p ON p.id=i.producto_id
+           JOIN categorias c ON c.id=p.categoria_id
+           WHERE i.cantidad_base > 0 AND c.nombre = 'Elaborados'"""
+    ).fetchall()
+    for r in elaborados:
+        costo_base = _costo_estimado(conn, r["producto_id"]) / a_base(r["unidad"], 1.0)
+        _abrir_capa(conn, r["producto_id"], r["sucursal_id"], r["cantidad_base"], costo_base, "SALDO")
+
+
+def _preparar_ventas_por_hora(conn):
+    # Bases existentes: se llena una sola vez desde ventas/ventas_detalle
+    if conn.execute("SELECT 1 FROM ventas_por_hora LIMIT 1").fetchone():
+        return
+    conn.execute(
+        """INSERT INTO ventas_por_hora(dia, hora, dia_semana, producto_id, tipo, cantidad, ingreso, lineas)
+           SELECT substr(v.creado_en, 1, 10), CAST(substr(v.creado_en, 12, 2) AS INTEGER),
+                  (CAST(strftime('%w', v.creado_en) AS INTEGER) + 6) % 7,
+                  d.producto_id, v.tipo, SUM(d.cantidad), SUM(d.subtotal), COUNT(*)
+           FROM ventas v JOIN ventas_detalle d ON d.venta_id=v.id
+           GROUP BY 1, 2, d.producto_id, v.tipo"""
+    )
+
+
 def iniciar_bd(nombre_sucursal: str):
     with conectar() as conn:
         _crear_tablas_basicas(conn)
@@ -100,13 +624,44 @@ def iniciar_bd(nombre_sucursal: str):
         )
 
 
+def _es_bloqueo(e: Exception) -> bool:
+    msg = str(e).lower()
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg)
+
+
+def _espera_reintento(intento: int):
+    # Backoff exponencial con jitter para que las cajas no reintenten al unísono
+    time.sleep(ESPERA_BASE_S * (2 ** intento) * (0.5 + random.random()))
+
+
+def _begin(conn, modo: str, reintentos: int):
+    for intento in range(reintentos + 1):
+        try:
+            conn.execute(f"BEGIN {modo}")
+            return
+        except sqlite3.OperationalError as e:
+            if not _es_bloqueo(e) or intento == reintentos:
+                raise
+            _espera_reintento(intento)
+
+
 @contextmanager
-def tx(conn=None):
+def tx(conn=None, modo: str = "DEFERRED", timeout: Optional[float] = None, reintentos: int = REINTENTOS_TX):
+    """
+    Transacción con commit/rollback automático.
+    modo IMMEDIATE/EXCLUSIVE toma el candado de escritura al inicio (con reintentos),
+    así la validación de stock y el descuento ocurren sin que otra caja escriba en medio.
+    """
+    modo = modo.upper()
+    if modo not in MODOS_TX:
+        raise ValueError(f"modo de transacción inválido: {modo}")
     propio = False
     if conn is None:
-        conn = conectar()
+        conn = conectar(timeout)
         propio = True
     try:
+        if modo != "DEFERRED" and not conn.in_transaction:
+            _begin(conn, modo, reintentos)
         yield conn
         conn.commit()
     except Exception:
@@ -117,6 +672,25 @@ def tx(conn=None):
             conn.close()
 
 
+def reintentar_tx(reintentos: int = REINTENTOS_TX):
+    """
+    Reintenta la función completa si SQLite responde 'database is locked'.
+    Solo para transacciones idempotentes: tx() ya hizo rollback, así que repetir es seguro.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            for intento in range(reintentos + 1):
+                try:
+                    return fn(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if not _es_bloqueo(e) or intento == reintentos:
+                        raise
+                    _espera_reintento(intento)
+        return envoltura
+    return deco
+
+
 def _id_por_nombre(conn, tabla, nombre):
     cur = conn.execute(f"SELECT id FROM {tabla} WHERE nombre=?", (nombre,))
     fila = cur.fetchone()
@@ -156,12 +730,16 @@ def crear_proveedor(
         )
 
 
-def listar_proveedores() -> List[Dict]:
-    with conectar() as conn:
-        rows = conn.execute(
-            "SELECT id, nombre, telefono FROM proveedores WHERE activo=1 ORDER BY nombre"
-        ).fetchall()
-        return [dict(r) for r in rows]
+def iter_proveedores(arraysize: int = ARRAYSIZE) -> Iterator[Proveedor]:
+    return _iterar(
+        "SELECT id, nombre, telefono FROM proveedores WHERE activo=1 ORDER BY nombre",
+        arraysize=arraysize,
+        tipo=Proveedor,
+    )
+
+
+def listar_proveedores() -> List[Proveedor]:
+    return list(iter_proveedores())
 
 
 # ------- Productos -------
@@ -190,56 +768,76 @@ def crear_producto(
         )
 
 
-def listar_productos() -> List[Dict]:
-    with conectar() as conn:
-        rows = conn.execute(
-            """SELECT p.id, p.nombre, p.unidad, p.es_vendible, p.precio, p.codigo, c.nombre as categoria
-               FROM productos p LEFT JOIN categorias c ON c.id=p.categoria_id
-               ORDER BY p.nombre"""
-        ).fetchall()
-        return [dict(r) for r in rows]
+def iter_productos(arraysize: int = ARRAYSIZE) -> Iterator[Producto]:
+    return _iterar(
+        """SELECT p.id, p.nombre, p.unidad, p.es_vendible, p.precio, p.codigo, c.nombre as categoria
+           FROM productos p LEFT JOIN categorias c ON c.id=p.categoria_id
+           ORDER BY p.nombre""",
+        arraysize=arraysize,
+        tipo=Producto,
+    )
 
 
-def listar_insumos() -> List[Dict]:
-    with conectar() as conn:
-        rows = conn.execute(
-            """SELECT id, nombre FROM productos
-               WHERE es_vendible=0 ORDER BY nombre"""
-        ).fetchall()
-        return [dict(r) for r in rows]
+def listar_productos() -> List[Producto]:
+    return list(iter_productos())
 
 
-def listar_elaborados() -> List[Dict]:
-    with conectar() as conn:
-        rows = conn.execute(
-            """SELECT p.id, p.nombre, p.codigo, p.precio
-               FROM productos p
-               JOIN categorias c ON c.id=p.categoria_id
-               WHERE p.es_vendible=1 AND c.nombre='Elaborados'
-               ORDER BY p.nombre"""
-        ).fetchall()
-        return [dict(r) for r in rows]
+def iter_insumos(arraysize: int = ARRAYSIZE) -> Iterator[Insumo]:
+    return _iterar(
+        """SELECT id, nombre FROM productos
+           WHERE es_vendible=0 ORDER BY nombre""",
+        arraysize=arraysize,
+        tipo=Insumo,
+    )
 
 
-def listar_vendibles() -> List[Dict]:
-    with conectar() as conn:
-        rows = conn.execute(
-            """SELECT id, nombre, codigo, precio FROM productos
-               WHERE es_vendible=1 ORDER BY nombre"""
-        ).fetchall()
-        return [dict(r) for r in rows]
+def listar_insumos() -> List[Insumo]:
+    return list(iter_insumos())
 
 
-def listar_para_compras() -> List[Dict]:
-    with conectar() as conn:
-        rows = conn.execute(
-            """SELECT p.id, p.nombre, p.unidad
-               FROM productos p
-               JOIN categorias c ON c.id=p.categoria_id
-               WHERE c.nombre IN ('Insumos','Productos')
-               ORDER BY p.nombre"""
-        ).fetchall()
-        return [dict(r) for r in rows]
+def iter_elaborados(arraysize: int = ARRAYSIZE) -> Iterator[Vendible]:
+    return _iterar(
+        """SELECT p.id, p.nombre, p.codigo, p.precio
+           FROM productos p
+           JOIN categorias c ON c.id=p.categoria_id
+           WHERE p.es_vendible=1 AND c.nombre='Elaborados'
+           ORDER BY p.nombre""",
+        arraysize=arraysize,
+        tipo=Vendible,
+    )
+
+
+def listar_elaborados() -> List[Vendible]:
+    return list(iter_elaborados())
+
+
+def iter_vendibles(arraysize: int = ARRAYSIZE) -> Iterator[Vendible]:
+    return _iterar(
+        """SELECT id, nombre, codigo, precio FROM productos
+           WHERE es_vendible=1 ORDER BY nombre""",
+        arraysize=arraysize,
+        tipo=Vendible,
+    )
+
+
+def listar_vendibles() -> List[Vendible]:
+    return list(iter_vendibles())
+
+
+def iter_para_compras(arraysize: int = ARRAYSIZE) -> Iterator[ProductoCompra]:
+    return _iterar(
+        """SELECT p.id, p.nombre, p.unidad
+           FROM productos p
+           JOIN categorias c ON c.id=p.categoria_id
+           WHERE c.nombre IN ('Insumos','Productos')
+           ORDER BY p.nombre""",
+        arraysize=arraysize,
+        tipo=ProductoCompra,
+    )
+
+
+def listar_para_compras() -> List[ProductoCompra]:
+    return list(iter_para_compras())
 
 
 def buscar_vendible_por_codigo(codigo: str) -> Optional[Dict]:
@@ -252,16 +850,16 @@ def buscar_vendible_por_codigo(codigo: str) -> Optional[Dict]:
         return dict(r) if r else None
 
 
-def buscar_vendibles_por_texto(q: str) -> List[Dict]:
+def buscar_vendibles_por_texto(q: str, limite: Optional[int] = None) -> List[Vendible]:
     q_like = f"%{q}%"
-    with conectar() as conn:
-        rows = conn.execute(
-            """SELECT id, nombre, codigo, precio FROM productos
-               WHERE es_vendible=1 AND (nombre LIKE ? OR codigo LIKE ?)
-               ORDER BY nombre""",
-            (q_like, q_like),
-        ).fetchall()
-        return [dict(r) for r in rows]
+    return list(_iterar(
+        """SELECT id, nombre, codigo, precio FROM productos
+           WHERE es_vendible=1 AND (nombre LIKE ? OR codigo LIKE ?)
+           ORDER BY nombre
+           LIMIT ?""",
+        (q_like, q_like, -1 if limite is None else limite),
+        tipo=Vendible,
+    ))
 
 
 # ------- Recetas -------
@@ -307,35 +905,175 @@ def obtener_receta(producto_menu: str) -> List[Dict]:
 
 
 # ------- Inventario -------
-def inventario_actual() -> List[Dict]:
+def inventario_actual() -> List[FilaInventario]:
+    # La conversión a la unidad del producto (desde_base) va en el mismo SELECT
+    return list(_iterar(
+        f"""SELECT p.nombre, p.unidad,
+                   i.cantidad_base / {_FACTOR_UNIDAD_SQL} AS cantidad,
+                   IFNULL(p.costo, 0.0) AS costo_unitario,
+                   IFNULL(c.nombre, '') AS categoria
+            FROM inventario i
+            JOIN productos p ON p.id=i.producto_id
+            LEFT JOIN categorias c ON c.id=p.categoria_id
+            ORDER BY p.nombre""",
+        tipo=FilaInventario,
+    ))
+
+
+# Costo unitario (por unidad del producto) ya guardado, sin recalcular recetas.
+# Si el producto no tiene costo propio (Elaborados), se usa su última capa de producción/compra
+# y, si no tiene capas, el costo de su receta.
+_FACTOR_UNIDAD_SQL = "(CASE p.unidad WHEN 'Kilo' THEN 1000.0 ELSE 1.0 END)"
+_SQL_COSTO_GUARDADO = {
+    "ULTIMO": "NULLIF(p.costo, 0)",
+    "PROMEDIO": "NULLIF(i.costo_promedio, 0)",
+    "FIFO": f"k.valor_fifo / NULLIF(MAX(i.cantidad_base, 0), 0) * {_FACTOR_UNIDAD_SQL}",
+}
+
+
+def _sql_costo_receta(columna_producto: str) -> str:
+    # Mismo cálculo que _costo_estimado para un Elaborado (NULL si no tiene receta);
+    # dentro de la subconsulta `p` es el componente.
+    return f"""(SELECT SUM(r.cantidad_base * {_SQL_COSTO_UNITARIO[METODO_COSTO]} / {_FACTOR_UNIDAD_SQL})
+                FROM recetas r JOIN productos p ON p.id=r.componente_producto_id
+                WHERE r.producto_menu_id={columna_producto})"""
+
+
+def valuacion_inventario(producto_ids: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Valor del inventario por producto, categoría y sucursal en una sola consulta.
+    Cada fila trae además el total de su categoría/sucursal y el total general.
+    Con METODO_COSTO="FIFO" el valor es el de las capas abiertas. El stock negativo
+    se reporta y se valúa como 0.
+    Con producto_ids solo se valúan esos productos (refresco parcial); los totales
+    de esas filas son entonces solo de los productos pedidos; valor_exacto (sin
+    redondear) permite recalcularlos al combinar filas.
+    """
+    if METODO_COSTO not in _SQL_COSTO_GUARDADO:
+        raise ValueError(f"METODO_COSTO debe ser uno de {METODOS_COSTO}")
+    filtro, params = "", ()
+    if producto_ids is not None:
+        filtro = "WHERE i.producto_id IN (SELECT value FROM json_each(?))"
+        params = (json.dumps([int(x) for x in producto_ids]),)
+    sql = f"""
+        WITH capas AS (
+            SELECT producto_id, sucursal_id,
+                   SUM(CASE WHEN restante_base > 0 THEN restante_base * costo_base END) AS valor_fifo,
+                   MAX(id) AS ultima
+            FROM capas_costo GROUP BY producto_id, sucursal_id
+        ),
+        val AS (
+            SELECT s.nombre AS sucursal, IFNULL(c.nombre, '') AS categoria,
+                   p.id AS producto_id, p.nombre, p.unidad, i.cantidad_base,
+                   MAX(i.cantidad_base, 0) / {_FACTOR_UNIDAD_SQL} AS cantidad,
+                   COALESCE({_SQL_COSTO_GUARDADO[METODO_COSTO]},
+                            (SELECT u.costo_base FROM capas_costo u WHERE u.id=k.ultima) * {_FACTOR_UNIDAD_SQL},
+                            {_sql_costo_receta("i.producto_id")},
+                            0) AS costo_unitario
+            FROM inventario i
+            JOIN productos p  ON p.id=i.producto_id
+            JOIN sucursales s ON s.id=i.sucursal_id
+            LEFT JOIN categorias c ON c.id=p.categoria_id
+            LEFT JOIN capas k ON k.producto_id=i.producto_id AND k.sucursal_id=i.sucursal_id
+            {filtro}
+        )
+        SELECT sucursal, categoria, producto_id, nombre, unidad, cantidad, costo_unitario,
+               cantidad * costo_unitario AS valor,
+               SUM(cantidad * costo_unitario) OVER (PARTITION BY sucursal, categoria) AS valor_categoria,
+               SUM(cantidad * costo_unitario) OVER () AS valor_total
+        FROM val
+        ORDER BY sucursal, categoria, nombre"""
+    with lectura() as conn:
+        return [
+            {
+                "sucursal": r["sucursal"],
+                "categoria": r["categoria"],
+                "producto_id": r["producto_id"],
+                "nombre": r["nombre"],
+                "unidad": r["unidad"],
+                "cantidad": r["cantidad"],
+                "costo_unitario": round(r["costo_unitario"], 4),
+                "valor": round(r["valor"], 2),
+                "valor_exacto": r["valor"],
+                "valor_categoria": round(r["valor_categoria"], 2),
+                "valor_total": round(r["valor_total"], 2),
+            }
+            for r in conn.execute(sql, params).fetchall()
+        ]
+
+
+def alertas_reorden(
+    dias_entrega: float = DIAS_ENTREGA,
+    dias_seguridad: float = DIAS_SEGURIDAD,
+    dias_objetivo: float = DIAS_OBJETIVO,
+    solo_alertas: bool = True,
+) -> List[Dict]:
+    """
+    Reorden según consumo real (VENTA, MERMA, PRODUCCION) de los últimos 7 y 28 días.
+    Lee consumo_diario (a lo más 28 filas por producto), nunca el libro de movimientos.
+    - velocidad: el mayor de los promedios diarios de 7 y 28 días (criterio conservador).
+    - alerta cuando la cobertura no alcanza para entrega + seguridad.
+    - sugerido: lo que falta para cubrir entrega + días objetivo.
+    """
+    hoy = _now_str()[:10]
     with conectar() as conn:
-        sql = """SELECT p.nombre, p.unidad, p.costo, i.cantidad_base, c.nombre AS categoria
-                 FROM inventario i
-                 JOIN productos p ON p.id=i.producto_id
-                 LEFT JOIN categorias c ON c.id=p.categoria_id
-                 ORDER BY p.nombre"""
-        rows = conn.execute(sql).fetchall()
-        arr = []
-        for r in rows:
-            arr.append(
-                {
-                    "nombre": r["nombre"],
-                    "unidad": r["unidad"],
-                    "cantidad": desde_base(r["unidad"], r["cantidad_base"]),
-                    "costo_unitario": r["costo"] or 0.0,
-                    "categoria": r["categoria"] or "",
-                }
-            )
-        return arr
+        rows = conn.execute(
+            """SELECT p.id, p.nombre, p.unidad, c.nombre AS categoria, i.sucursal_id, s.nombre AS sucursal,
+                      i.cantidad_base AS stock,
+                      IFNULL(SUM(CASE WHEN cd.dia >= date(?, ?) THEN cd.cantidad_base END), 0) AS uso_corto,
+                      IFNULL(SUM(cd.cantidad_base), 0) AS uso_largo
+               FROM inventario i
+               JOIN productos p ON p.id=i.producto_id
+               JOIN sucursales s ON s.id=i.sucursal_id
+               LEFT JOIN categorias c ON c.id=p.categoria_id
+               LEFT JOIN consumo_diario cd
+                      ON cd.producto_id=i.producto_id AND cd.sucursal_id=i.sucursal_id
+                     AND cd.dia >= date(?, ?)
+               GROUP BY i.id
+               ORDER BY p.nombre, s.nombre""",
+            (hoy, f"-{VENTANA_CORTA_DIAS - 1} days", hoy, f"-{VENTANA_LARGA_DIAS - 1} days"),
+        ).fetchall()
+
+    out = []
+    for r in rows:
+        vel = max(r["uso_corto"] / VENTANA_CORTA_DIAS, r["uso_largo"] / VENTANA_LARGA_DIAS)
+        if vel <= 0:
+            if solo_alertas:
+                continue
+            cobertura = None
+        else:
+            cobertura = max(r["stock"], 0.0) / vel
+        alerta = cobertura is not None and cobertura < (dias_entrega + dias_seguridad)
+        if solo_alertas and not alerta:
+            continue
+        sugerido = max(0.0, vel * (dias_entrega + dias_seguridad + dias_objetivo) - r["stock"])
+        u = r["unidad"]
+        out.append({
+            "producto_id": r["id"],
+            "sucursal_id": r["sucursal_id"],
+            "sucursal": r["sucursal"],
+            "nombre": r["nombre"],
+            "unidad": u,
+            "categoria": r["categoria"] or "",
+            "stock": desde_base(u, r["stock"]),
+            "uso_7d": desde_base(u, r["uso_corto"]),
+            "uso_28d": desde_base(u, r["uso_largo"]),
+            "consumo_diario": desde_base(u, vel),
+            "dias_cobertura": None if cobertura is None else round(cobertura, 1),
+            "punto_reorden": desde_base(u, vel * (dias_entrega + dias_seguridad)),
+            "sugerido": desde_base(u, sugerido),
+            "alerta": alerta,
+        })
+    return out
 
 
 def _insert_mov_inv(conn, producto_id: int, sucursal_id: int, cantidad_base: float, motivo: str, ref_tabla: str, ref_id: Optional[int], nota: str):
     # Inserta movimiento con fecha local si la columna existe
     if _col_exists(conn, "movimientos_inventario", "creado_en"):
         conn.execute(
-            """INSERT INTO movimientos_inventario(producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota, creado_en)
-               VALUES(?,?,?,?,?,?,?,?)""",
-            (producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota, _now_str()),
+            """INSERT INTO movimientos_inventario(producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota, creado_ts, creado_en)
+               VALUES(?,?,?,?,?,?,?,?,?)""",
+            (producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota) + _ahora(),
         )
     else:
         conn.execute(
@@ -345,8 +1083,64 @@ def _insert_mov_inv(conn, producto_id: int, sucursal_id: int, cantidad_base: flo
         )
 
 
+def _descontar_stock(conn, producto_id: int, sucursal_id: int, cantidad_base: float) -> bool:
+    # Descuento condicional: no deja stock negativo aunque otra caja haya vendido antes
+    cur = conn.execute(
+        """UPDATE inventario SET cantidad_base = cantidad_base - ?
+           WHERE producto_id=? AND sucursal_id=? AND cantidad_base >= ?""",
+        (cantidad_base, producto_id, sucursal_id, cantidad_base),
+    )
+    return cur.rowcount == 1
+
+
+def _abrir_capa(conn, producto_id: int, sucursal_id: int, cantidad_base: float, costo_base: float,
+                origen: str, ref_id: Optional[int] = None):
+    if cantidad_base <= 0:
+        return
+    conn.execute(
+        """INSERT INTO capas_costo(producto_id, sucursal_id, origen, ref_id, cantidad_base, restante_base, costo_base, creado_en)
+           VALUES(?,?,?,?,?,?,?,?)""",
+        (producto_id, sucursal_id, origen, ref_id, cantidad_base, cantidad_base, costo_base, _now_str()),
+    )
+
+
+def _consumir_capas(conn, producto_id: int, sucursal_id: int, cantidad_base: float) -> float:
+    """
+    Consume capas abiertas de la más antigua a la más nueva y devuelve su costo.
+    Cada capa se busca por el índice parcial idx_capas_abiertas (O(log n)).
+    Lo que no alcance a cubrirse con capas se costea con el costo estimado actual.
+    """
+    pendiente = cantidad_base
+    costo = 0.0
+    while pendiente > 1e-9:
+        capas = conn.execute(
+            """SELECT id, restante_base, costo_base FROM capas_costo
+               WHERE producto_id=? AND sucursal_id=? AND restante_base > 0
+               ORDER BY id LIMIT 8""",
+            (producto_id, sucursal_id),
+        ).fetchall()
+        if not capas:
+            break
+        for capa in capas:
+            tomado = min(pendiente, capa["restante_base"])
+            resto = capa["restante_base"] - tomado
+            conn.execute(
+                "UPDATE capas_costo SET restante_base=? WHERE id=?",
+                (resto if resto > 1e-9 else 0.0, capa["id"]),
+            )
+            costo += tomado * capa["costo_base"]
+            pendiente -= tomado
+            if pendiente <= 1e-9:
+                break
+    if pendiente > 1e-9:
+        unidad = conn.execute("SELECT unidad FROM productos WHERE id=?", (producto_id,)).fetchone()["unidad"]
+        costo += _costo_estimado(conn, producto_id) * desde_base(unidad, pendiente)
+    return costo
+
+
+@reintentar_tx()
 def ajustar(producto: str, delta: float, nota: str = "Ajuste"):
-    with tx() as conn:
+    with tx(modo="IMMEDIATE") as conn:
         pid = _id_por_nombre(conn, "productos", producto)
         prod = conn.execute("SELECT unidad FROM productos WHERE id=?", (pid,)).fetchone()
         r = conn.execute("SELECT id FROM sucursales LIMIT 1").fetchone()
@@ -362,20 +1156,89 @@ def ajustar(producto: str, delta: float, nota: str = "Ajuste"):
             "UPDATE inventario SET cantidad_base = cantidad_base + ? WHERE producto_id=? AND sucursal_id=?",
             (base, pid, suc_id),
         )
+        if base > 0:
+            _abrir_capa(conn, pid, suc_id, base, _costo_estimado(conn, pid) / a_base(prod["unidad"], 1.0), "AJUSTE")
+        else:
+            _consumir_capas(conn, pid, suc_id, -base)
         _insert_mov_inv(conn, pid, suc_id, base, "AJUSTE", "inventario", None, nota)
 
 
+# ------- Cambios (refresco en vivo) -------
+def version_cambios() -> int:
+    with lectura() as conn:
+        return conn.execute("SELECT IFNULL(MAX(version), 0) FROM cambios").fetchone()[0]
+
+
+def _cambios_desde(conn, version: int) -> Tuple[int, Dict[str, Set[int]]]:
+    cambios: Dict[str, Set[int]] = {}
+    ultima = version
+    for r in conn.execute(
+        "SELECT tabla, fila_id, version FROM cambios WHERE version > ? ORDER BY version", (version,)
+    ):
+        cambios.setdefault(r["tabla"], set()).add(r["fila_id"])
+        ultima = r["version"]
+    return ultima, cambios
+
+
+def cambios_desde(version: int) -> Dict:
+    """
+    Filas tocadas después de `version`, por tabla: {"version": última, "cambios": {tabla: [ids]}}.
+    Para clientes sin conexión propia a la base (servidor.py); en local usar VigilanteCambios.
+    """
+    with lectura() as conn:
+        ultima, cambios = _cambios_desde(conn, version)
+    return {"version": ultima, "cambios": {t: sorted(ids) for t, ids in cambios.items()}}
+
+
+class VigilanteCambios:
+    """
+    Detecta commits de cualquier conexión o proceso con PRAGMA data_version, que no lee
+    tablas; solo cuando cambia se consulta `cambios` (por índice de versión).
+    Mantiene su propia conexión: data_version es por conexión.
+    """
+
+    def __init__(self):
+        self.conn = conectar_lectura()
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        with lectura(self.conn):
+            self.version = self.conn.execute("SELECT IFNULL(MAX(version), 0) FROM cambios").fetchone()[0]
+
+    def revisar(self) -> Dict[str, Set[int]]:
+        """Filas tocadas desde la revisión anterior, por tabla ({} si nadie escribió)."""
+        dv = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if dv == self._data_version:
+            return {}
+        self._data_version = dv
+        with lectura(self.conn):
+            self.version, cambios = _cambios_desde(self.conn, self.version)
+        return cambios
+
+    def cerrar(self):
+        self.conn.close()
+
+
 # ------- Compras -------
+def _promedio_ponderado(stock_base: float, costo_actual: float, entrada_base: float, costo_entrada: float) -> float:
+    # Las cantidades van en unidad base: la escala es lineal, el promedio sale por unidad del producto
+    stock_base = max(stock_base or 0.0, 0.0)
+    total = stock_base + entrada_base
+    if total <= 0:
+        return costo_entrada
+    return (stock_base * (costo_actual or 0.0) + entrada_base * costo_entrada) / total
+
+
+@reintentar_tx()
 def registrar_compra(
     items: List[Tuple[str, float, float]],
     proveedor: Optional[str] = None,
     nota: str = "",
 ) -> int:
-    with tx() as conn:
+    with tx(modo="IMMEDIATE") as conn:
         r = conn.execute("SELECT id FROM sucursales LIMIT 1").fetchone()
         if not r:
             raise ValueError("No hay sucursal registrada.")
         suc_id = r["id"]
+        metodo = _metodo_costo(conn)
 
         proveedor_id = None
         if proveedor:
@@ -389,8 +1252,8 @@ def registrar_compra(
         # Inserta compra con fecha local si la columna existe
         if _col_exists(conn, "compras", "creado_en"):
             cur = conn.execute(
-                "INSERT INTO compras(sucursal_id, total, proveedor_id, creado_en) VALUES (?,?,?,?)",
-                (suc_id, 0, proveedor_id, _now_str()),
+                "INSERT INTO compras(sucursal_id, total, proveedor_id, creado_ts, creado_en) VALUES (?,?,?,?,?)",
+                (suc_id, 0, proveedor_id) + _ahora(),
             )
         else:
             cur = conn.execute(
@@ -413,21 +1276,32 @@ def registrar_compra(
             if costo_total < 0:
                 raise ValueError("Costo total no puede ser negativo")
             costo_unitario = (costo_total / cant) if cant != 0 else 0.0
-            conn.execute(
+            cur = conn.execute(
                 """INSERT INTO compras_detalle(compra_id, producto_id, cantidad, costo_total, costo_unitario)
                    VALUES(?,?,?,?,?)""",
                 (compra_id, pid, cant, costo_total, costo_unitario),
             )
-            conn.execute("UPDATE productos SET costo=? WHERE id=?", (costo_unitario, pid))
+            detalle_id = cur.lastrowid
             conn.execute(
                 "INSERT OR IGNORE INTO inventario(producto_id, sucursal_id, cantidad_base) VALUES(?,?,0)",
                 (pid, suc_id),
             )
             base = a_base(unidad, cant)
+            inv = conn.execute(
+                "SELECT cantidad_base, costo_promedio FROM inventario WHERE producto_id=? AND sucursal_id=?",
+                (pid, suc_id),
+            ).fetchone()
+            promedio = _promedio_ponderado(inv["cantidad_base"], inv["costo_promedio"], base, costo_unitario)
             conn.execute(
-                "UPDATE inventario SET cantidad_base = cantidad_base + ? WHERE producto_id=? AND sucursal_id=?",
-                (base, pid, suc_id),
+                """UPDATE inventario SET cantidad_base = cantidad_base + ?, costo_promedio = ?
+                   WHERE producto_id=? AND sucursal_id=?""",
+                (base, promedio, pid, suc_id),
             )
+            conn.execute(
+                "UPDATE productos SET costo=? WHERE id=?",
+                (promedio if metodo == "PROMEDIO" else costo_unitario, pid),
+            )
+            _abrir_capa(conn, pid, suc_id, base, costo_total / base, "COMPRA", detalle_id)
             _insert_mov_inv(conn, pid, suc_id, base, "COMPRA", "compras", compra_id, nota)
             total_compra += costo_total
 
@@ -437,80 +1311,141 @@ def registrar_compra(
 
 # ------- Producción -------
 def registrar_produccion(producto_menu: str, cantidad: float, nota: str = "") -> int:
-    if cantidad <= 0:
-        raise ValueError("La cantidad a producir debe ser > 0")
-    with tx() as conn:
-        r = conn.execute(
-            """SELECT p.id, p.unidad, c.nombre AS cat
-               FROM productos p JOIN categorias c ON c.id=p.categoria_id
-               WHERE p.nombre=?""",
-            (producto_menu,),
-        ).fetchone()
-        if not r:
-            raise ValueError(f"Producto '{producto_menu}' no existe")
-        if r["cat"] != "Elaborados":
-            raise ValueError("Solo se puede producir un producto de categoría 'Elaborados'")
-        menu_id = r["id"]
-        unidad_menu = r["unidad"]
-        suc = conn.execute("SELECT id FROM sucursales LIMIT 1").fetchone()
-        suc_id = suc["id"]
-        receta = conn.execute(
-            "SELECT componente_producto_id, cantidad_base FROM recetas WHERE producto_menu_id=?",
-            (menu_id,),
-        ).fetchall()
-        if not receta:
-            raise ValueError("El producto no tiene receta definida")
+    return registrar_orden_produccion([(producto_menu, cantidad)], nota)[0]
 
-        # Validación stock
-        for row in receta:
-            comp_id, por_u = row["componente_producto_id"], row["cantidad_base"]
-            req = por_u * cantidad
-            cur = conn.execute(
-                "SELECT cantidad_base FROM inventario WHERE producto_id=? AND sucursal_id=?",
-                (comp_id, suc_id),
-            ).fetchone()
-            if not cur or cur["cantidad_base"] < req:
-                raise ValueError("Stock insuficiente de componentes para producir")
 
-        # Consumir componentes
-        for row in receta:
-            comp_id, por_u = row["componente_producto_id"], row["cantidad_base"]
-            req = por_u * cantidad
-            conn.execute(
-                "UPDATE inventario SET cantidad_base = cantidad_base - ? WHERE producto_id=? AND sucursal_id=?",
-                (req, comp_id, suc_id),
+@reintentar_tx()
+def registrar_orden_produccion(items: List[Tuple[str, float]], nota: str = "") -> List[int]:
+    """
+    Produce varios Elaborados en una sola transacción: todo o nada.
+    La demanda de componentes se suma entre todas las recetas, se valida con una
+    sola consulta y se aplica con executemany. Devuelve los ids de producciones.
+    """
+    pedido: Dict[str, float] = {}
+    for nombre, cantidad in items:
+        if cantidad <= 0:
+            raise ValueError("La cantidad a producir debe ser > 0")
+        pedido[nombre] = pedido.get(nombre, 0.0) + cantidad
+    if not pedido:
+        raise ValueError("La orden de producción está vacía")
+
+    with tx(modo="IMMEDIATE") as conn:
+        marcas = ",".join("?" * len(pedido))
+        prods = {
+            r["nombre"]: r for r in conn.execute(
+                f"""SELECT p.id, p.nombre, p.unidad, c.nombre AS cat
+                    FROM productos p JOIN categorias c ON c.id=p.categoria_id
+                    WHERE p.nombre IN ({marcas})""",
+                list(pedido),
             )
-            _insert_mov_inv(conn, comp_id, suc_id, -req, "PRODUCCION", "producciones", None, nota)
-
-        # Abonar elaborado
-        base_u = a_base(unidad_menu, cantidad)
-        conn.execute(
+        }
+        for nombre in pedido:
+            if nombre not in prods:
+                raise ValueError(f"Producto '{nombre}' no existe")
+            if prods[nombre]["cat"] != "Elaborados":
+                raise ValueError("Solo se puede producir un producto de categoría 'Elaborados'")
+        suc_id = conn.execute("SELECT id FROM sucursales LIMIT 1").fetchone()["id"]
+
+        ids = [prods[n]["id"] for n in pedido]
+        recetas: Dict[int, List[Tuple[int, float]]] = {}
+        for r in conn.execute(
+            f"""SELECT producto_menu_id, componente_producto_id, cantidad_base
+                FROM recetas WHERE producto_menu_id IN ({marcas})""",
+            ids,
+        ):
+            recetas.setdefault(r["producto_menu_id"], []).append(
+                (r["componente_producto_id"], r["cantidad_base"]))
+        for nombre in pedido:
+            if prods[nombre]["id"] not in recetas:
+                raise ValueError(f"'{nombre}' no tiene receta definida")
+
+        # Demanda total por componente
+        demanda: Dict[int, float] = {}
+        for nombre, cantidad in pedido.items():
+            for comp_id, por_u in recetas[prods[nombre]["id"]]:
+                demanda[comp_id] = demanda.get(comp_id, 0.0) + por_u * cantidad
+
+        valores = ",".join(["(?,?)"] * len(demanda))
+        faltantes = conn.execute(
+            f"""WITH req(producto_id, cantidad_base) AS (VALUES {valores})
+                SELECT p.nombre, p.unidad, req.cantidad_base AS req,
+                       IFNULL(i.cantidad_base, 0) AS stock
+                FROM req
+                JOIN productos p ON p.id=req.producto_id
+                LEFT JOIN inventario i ON i.producto_id=req.producto_id AND i.sucursal_id=?
+                WHERE IFNULL(i.cantidad_base, 0) < req.cantidad_base
+                ORDER BY p.nombre""",
+            [x for par in demanda.items() for x in par] + [suc_id],
+        ).fetchall()
+        if faltantes:
+            raise ValueError("Stock insuficiente de componentes para producir:\n" + "\n".join(
+                f"• {f['nombre']}: disponible {desde_base(f['unidad'], f['stock']):.3f}, "
+                f"requerido {desde_base(f['unidad'], f['req']):.3f}"
+                for f in faltantes))
+
+        cur = conn.executemany(
+            """UPDATE inventario SET cantidad_base = cantidad_base - ?
+               WHERE producto_id=? AND sucursal_id=? AND cantidad_base >= ?""",
+            [(req, comp_id, suc_id, req) for comp_id, req in demanda.items()],
+        )
+        if cur.rowcount != len(demanda):
+            raise ValueError("Stock insuficiente de componentes para producir")
+
+        # Fecha local si existen las columnas (BD antiguas usan el DEFAULT)
+        ahora = _ahora()
+        fecha_prod = _col_exists(conn, "producciones", "creado_en")
+        fecha_mov = _col_exists(conn, "movimientos_inventario", "creado_en")
+        prod_ids, movs, abonos = [], [], []
+        for nombre, cantidad in pedido.items():
+            menu_id = prods[nombre]["id"]
+            if fecha_prod:
+                cur = conn.execute(
+                    "INSERT INTO producciones(producto_id, sucursal_id, cantidad, nota, creado_ts, creado_en) VALUES(?,?,?,?,?,?)",
+                    (menu_id, suc_id, cantidad, nota) + ahora,
+                )
+            else:
+                cur = conn.execute(
+                    "INSERT INTO producciones(producto_id, sucursal_id, cantidad, nota) VALUES(?,?,?,?)",
+                    (menu_id, suc_id, cantidad, nota),
+                )
+            prod_id = cur.lastrowid
+            prod_ids.append(prod_id)
+            costo_lote = 0.0
+            for comp_id, por_u in recetas[menu_id]:
+                movs.append((comp_id, suc_id, -por_u * cantidad, "PRODUCCION", "producciones", prod_id, nota))
+                costo_lote += _consumir_capas(conn, comp_id, suc_id, por_u * cantidad)
+            base_u = a_base(prods[nombre]["unidad"], cantidad)
+            _abrir_capa(conn, menu_id, suc_id, base_u, costo_lote / base_u, "PRODUCCION", prod_id)
+            abonos.append((base_u, menu_id, suc_id))
+            movs.append((menu_id, suc_id, base_u, "PRODUCCION", "producciones", prod_id, nota))
+
+        conn.executemany(
             "UPDATE inventario SET cantidad_base = cantidad_base + ? WHERE producto_id=? AND sucursal_id=?",
-            (base_u, menu_id, suc_id),
+            abonos,
         )
-        # Producción con fecha local si existe la columna
-        if _col_exists(conn, "producciones", "creado_en"):
-            cur = conn.execute(
-                "INSERT INTO producciones(producto_id, sucursal_id, cantidad, nota, creado_en) VALUES(?,?,?,?,?)",
-                (menu_id, suc_id, cantidad, nota, _now_str()),
+        if fecha_mov:
+            conn.executemany(
+                """INSERT INTO movimientos_inventario(producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota, creado_ts, creado_en)
+                   VALUES(?,?,?,?,?,?,?,?,?)""",
+                [m + ahora for m in movs],
             )
         else:
-            cur = conn.execute(
-                "INSERT INTO producciones(producto_id, sucursal_id, cantidad, nota) VALUES(?,?,?,?)",
-                (menu_id, suc_id, cantidad, nota),
+            conn.executemany(
+                """INSERT INTO movimientos_inventario(producto_id, sucursal_id, cantidad_base, motivo, ref_tabla, ref_id, nota)
+                   VALUES(?,?,?,?,?,?,?)""",
+                movs,
             )
-        prod_id = cur.lastrowid
-        _insert_mov_inv(conn, menu_id, suc_id, base_u, "PRODUCCION", "producciones", prod_id, nota)
-        return prod_id
+        return prod_ids
 
 
 # ------- Ventas / Merma -------
+@reintentar_tx()
 def registrar_venta(
     tipo: str, items: List[Tuple[int, float]], cajero: Optional[str] = None, nota: str = ""
 ) -> int:
     if tipo not in (VENTA, MERMA):
         raise ValueError("tipo debe ser 'VENTA' o 'MERMA'")
-    with tx() as conn:
+    with tx(modo="IMMEDIATE") as conn:
         r = conn.execute("SELECT id FROM sucursales LIMIT 1").fetchone()
         if not r:
             raise ValueError("No hay sucursal registrada.")
@@ -519,8 +1454,8 @@ def registrar_venta(
         # Insertar venta con fecha local si existe la columna
         if _col_exists(conn, "ventas", "creado_en"):
             cur = conn.execute(
-                "INSERT INTO ventas(tipo, sucursal_id, cajero, creado_en) VALUES (?,?,?,?)",
-                (tipo, suc_id, None, _now_str()),
+                "INSERT INTO ventas(tipo, sucursal_id, cajero, creado_ts, creado_en) VALUES (?,?,?,?,?)",
+                (tipo, suc_id, None) + _ahora(),
             )
         else:
             cur = conn.execute(
@@ -544,26 +1479,21 @@ def registrar_venta(
             precio_unit = 0.0 if tipo == MERMA else precio_catalogo
             subtotal = precio_unit * cant  # MERMA => 0
 
+            # Descontar stock del producto vendido (elaborado/producto) y su costo FIFO
+            base = a_base(prod["unidad"], cant)
+            if not _descontar_stock(conn, prod["id"], suc_id, base):
+                raise ValueError(f"Stock insuficiente de '{prod['nombre']}'")
+            costo = _consumir_capas(conn, prod["id"], suc_id, base)
+
             # Guardamos precio histórico en el detalle SIEMPRE (en MERMA, el de catálogo del día)
             conn.execute(
-                """INSERT INTO ventas_detalle(venta_id, producto_id, cantidad, precio_unitario, subtotal)
-                   VALUES(?,?,?,?,?)""",
-                (venta_id, prod["id"], cant, (precio_catalogo if tipo == MERMA else precio_unit), subtotal),
+                """INSERT INTO ventas_detalle(venta_id, producto_id, cantidad, precio_unitario, subtotal, costo_total)
+                   VALUES(?,?,?,?,?,?)""",
+                (venta_id, prod["id"], cant, (precio_catalogo if tipo == MERMA else precio_unit), subtotal,
+                 round(costo, 6)),
             )
             total += subtotal
 
-            # Descontar stock del producto vendido (elaborado/producto)
-            base = a_base(prod["unidad"], cant)
-            curq = conn.execute(
-                "SELECT cantidad_base FROM inventario WHERE producto_id=? AND sucursal_id=?",
-                (prod["id"], suc_id),
-            ).fetchone()
-            if not curq or curq["cantidad_base"] < base:
-                raise ValueError(f"Stock insuficiente de '{prod['nombre']}'")
-            conn.execute(
-                "UPDATE inventario SET cantidad_base = cantidad_base - ? WHERE producto_id=? AND sucursal_id=?",
-                (base, prod["id"], suc_id),
-            )
             _insert_mov_inv(conn, prod["id"], suc_id, -base, tipo, "ventas", venta_id, nota)
 
         conn.execute("UPDATE ventas SET total=? WHERE id=?", (total, venta_id))
@@ -572,58 +1502,68 @@ def registrar_venta(
 
 # ------- Reportes -------
 def reporte_ventas_detallado(desde: str = None, hasta: str = None):
-    params = []
-    where = ["v.tipo='VENTA'"]
-    if desde:
-        where.append("date(v.creado_en)>=date(?)"); params.append(desde)
-    if hasta:
-        where.append("date(v.creado_en)<=date(?)"); params.append(hasta)
-    where_sql = "WHERE " + " AND ".join(where)
+    return list(iter_reporte_ventas_detallado(desde, hasta))
+
+
+def iter_reporte_ventas_detallado(desde: str = None, hasta: str = None,
+                                  arraysize: int = ARRAYSIZE) -> Iterator[LineaVenta]:
+    where, params = _filtro_ts("v.creado_ts", desde, hasta)
+    where_sql = "WHERE " + " AND ".join(["v.tipo='VENTA'"] + where)
 
     sql = f"""SELECT v.creado_en as fecha,
                      p.id   as producto_id,
                      p.nombre as producto,
-                     d.cantidad, d.precio_unitario, d.subtotal
+                     d.cantidad, d.precio_unitario, d.subtotal, d.costo_total
               FROM ventas v
               JOIN ventas_detalle d ON d.venta_id=v.id
               JOIN productos p      ON p.id=d.producto_id
               {where_sql}
-              ORDER BY v.creado_en, p.nombre"""
-
-    rows_out = []
-    with conectar() as conn:
-        for r in conn.execute(sql, tuple(params)).fetchall():
-            cantidad = float(r["cantidad"] or 0)
-            p_venta  = float(r["precio_unitario"] or 0)
-            costo_u  = float(costo_estimado_producto(r["producto_id"]) or 0)
-            margen_u = p_venta - costo_u
-            margen_t = margen_u * cantidad
-            margen_pct = (margen_u / p_venta * 100.0) if p_venta > 0 else 0.0
-
-            rows_out.append({
-                "fecha": r["fecha"],
-                "producto": r["producto"],
-                "cantidad": cantidad,
-                "precio_unitario": p_venta,
-                "costo_unitario": round(costo_u, 2),
-                "margen_unit": round(margen_u, 2),
-                "margen_total": round(margen_t, 2),
-                "margen_pct": round(margen_pct, 2),
-                "subtotal": float(r["subtotal"] or 0)
-            })
-    return rows_out
+              ORDER BY v.creado_ts, v.id, p.nombre"""
+
+    costos: Dict[int, float] = {}
+    with lectura() as conn:
+        cur = conn.execute(sql, tuple(params))
+        cur.arraysize = arraysize
+        while True:
+            lote = cur.fetchmany()
+            if not lote:
+                return
+            for r in lote:
+                cantidad = float(r["cantidad"] or 0)
+                p_venta  = float(r["precio_unitario"] or 0)
+                pid = r["producto_id"]
+                if METODO_COSTO == "FIFO" and r["costo_total"] is not None and cantidad > 0:
+                    # Costo real de la venta, guardado al registrarla
+                    costo_u = float(r["costo_total"]) / cantidad
+                else:
+                    if pid not in costos:
+                        costos[pid] = float(_costo_estimado(conn, pid) or 0)
+                    costo_u = costos[pid]
+                margen_u = p_venta - costo_u
+                margen_t = margen_u * cantidad
+                margen_pct = (margen_u / p_venta * 100.0) if p_venta > 0 else 0.0
+
+                yield LineaVenta(
+                    r["fecha"],
+                    r["producto"],
+                    cantidad,
+                    p_venta,
+                    round(costo_u, 2),
+                    round(margen_u, 2),
+                    round(margen_t, 2),
+                    round(margen_pct, 2),
+                    float(r["subtotal"] or 0),
+                )
 
 
 def reporte_merma_detallado(desde: str = None, hasta: str = None):
-    params = []
-    where = ["v.tipo='MERMA'"]
-    if desde:
-        where.append("date(v.creado_en)>=date(?)")
-        params.append(desde)
-    if hasta:
-        where.append("date(v.creado_en)<=date(?)")
-        params.append(hasta)
-    where_sql = "WHERE " + " AND ".join(where)
+    return list(iter_reporte_merma_detallado(desde, hasta))
+
+
+def iter_reporte_merma_detallado(desde: str = None, hasta: str = None,
+                                 arraysize: int = ARRAYSIZE) -> Iterator[LineaMerma]:
+    where, params = _filtro_ts("v.creado_ts", desde, hasta)
+    where_sql = "WHERE " + " AND ".join(["v.tipo='MERMA'"] + where)
     sql = f"""SELECT v.creado_en as fecha,
                      p.nombre as producto,
                      d.cantidad,
@@ -633,9 +1573,8 @@ def reporte_merma_detallado(desde: str = None, hasta: str = None):
               JOIN ventas_detalle d ON d.venta_id=v.id
               JOIN productos p ON p.id=d.producto_id
               {where_sql}
-              ORDER BY v.creado_en, p.nombre"""
-    with conectar() as conn:
-        return [dict(r) for r in conn.execute(sql, tuple(params)).fetchall()]
+              ORDER BY v.creado_ts, v.id, p.nombre"""
+    return _iterar(sql, tuple(params), arraysize, LineaMerma)
 
 
 def reporte_compras_detallado(desde: str = None, hasta: str = None, proveedor: str = None):
@@ -643,12 +1582,12 @@ def reporte_compras_detallado(desde: str = None, hasta: str = None, proveedor: s
     Reporte de compras: fecha, proveedor, producto, cantidad, UNIDAD, costo unitario, costo total.
     Permite filtrar por proveedor (nombre exacto).
     """
-    params = []
-    where = []
-    if desde:
-        where.append("date(c.creado_en)>=date(?)"); params.append(desde)
-    if hasta:
-        where.append("date(c.creado_en)<=date(?)"); params.append(hasta)
+    return list(iter_reporte_compras_detallado(desde, hasta, proveedor))
+
+
+def iter_reporte_compras_detallado(desde: str = None, hasta: str = None, proveedor: str = None,
+                                   arraysize: int = ARRAYSIZE) -> Iterator[LineaCompra]:
+    where, params = _filtro_ts("c.creado_ts", desde, hasta)
     if proveedor:
         where.append("IFNULL(pr.nombre,'') = ?"); params.append(proveedor)
     where_sql = ("WHERE " + " AND ".join(where)) if where else ""
@@ -666,30 +1605,225 @@ def reporte_compras_detallado(desde: str = None, hasta: str = None, proveedor: s
         JOIN productos p ON p.id=cd.producto_id
         LEFT JOIN proveedores pr ON pr.id=c.proveedor_id
         {where_sql}
-        ORDER BY c.creado_en, pr.nombre, p.nombre
+        ORDER BY c.creado_ts, c.id, pr.nombre, p.nombre
     """
-    with conectar() as conn:
-        return [dict(r) for r in conn.execute(sql, tuple(params)).fetchall()]
+    return _iterar(sql, tuple(params), arraysize, LineaCompra)
 
 
 def top_productos(lim: int = 10, desde: str = None, hasta: str = None):
-    params = []
-    where = ["v.tipo='VENTA'"]
-    if desde:
-        where.append("date(v.creado_en)>=date(?)")
-        params.append(desde)
-    if hasta:
-        where.append("date(v.creado_en)<=date(?)")
-        params.append(hasta)
-    where_sql = "WHERE " + " AND ".join(where)
+    where, params = _filtro_ts("v.creado_ts", desde, hasta)
+    where_sql = "WHERE " + " AND ".join(["v.tipo='VENTA'"] + where)
     sql = f"""SELECT p.nombre, SUM(d.cantidad) as cantidad, SUM(d.subtotal) as ingreso
               FROM ventas_detalle d JOIN productos p ON p.id=d.producto_id
               JOIN ventas v ON v.id=d.venta_id {where_sql}
               GROUP BY p.nombre ORDER BY ingreso DESC LIMIT ?"""
     params.append(lim)
-    with conectar() as conn:
+    with lectura() as conn:
         return [dict(r) for r in conn.execute(sql, tuple(params)).fetchall()]
 
+def reporte_heatmap(desde: str = None, hasta: str = None, producto: str = None, medida: str = "ingreso"):
+    """
+    Ventas por hora (0-23) × día de la semana (lunes=0) desde la tabla de cubetas.
+    Filtra por rango de días comparando texto 'YYYY-MM-DD' (usa el índice), sin date().
+    """
+    if medida not in ("ingreso", "cantidad", "lineas"):
+        raise ValueError("medida debe ser 'ingreso', 'cantidad' o 'lineas'")
+    params = []
+    where = ["b.tipo='VENTA'"]
+    if desde:
+        where.append("b.dia >= ?"); params.append(desde[:10])
+    if hasta:
+        where.append("b.dia <= ?"); params.append(hasta[:10])
+    if producto:
+        where.append("b.producto_id = (SELECT id FROM productos WHERE nombre=?)"); params.append(producto)
+    sql = f"""SELECT b.hora, b.dia_semana, SUM(b.{medida}) AS valor
+              FROM ventas_por_hora b
+              WHERE {" AND ".join(where)}
+              GROUP BY b.hora, b.dia_semana"""
+    celdas = [[0.0] * 7 for _ in range(24)]
+    with lectura() as conn:
+        for r in conn.execute(sql, tuple(params)).fetchall():
+            celdas[r["hora"]][r["dia_semana"]] = float(r["valor"] or 0)
+    return [{"hora": h, "dias": celdas[h], "total": sum(celdas[h])} for h in range(24)]
+
+
+# ------- Corte del día -------
+CONCEPTOS_CORTE = (VENTA, MERMA, "COMPRA", "PRODUCCION")
+
+# Totales por día y concepto a partir de las tablas crudas, para [desde, hasta) en creado_ts.
+# En MERMA el importe es lo que se dejó de vender (precio de catálogo × cantidad).
+_SQL_TOTALES_DIA = """
+    SELECT substr(v.creado_en, 1, 10) AS dia, v.tipo AS concepto,
+           COUNT(DISTINCT v.id) AS operaciones, SUM(d.cantidad) AS cantidad,
+           SUM(CASE WHEN v.tipo='MERMA' THEN d.precio_unitario * d.cantidad ELSE d.subtotal END) AS importe,
+           SUM(IFNULL(d.costo_total, 0)) AS costo
+    FROM ventas v JOIN ventas_detalle d ON d.venta_id=v.id
+    WHERE v.creado_ts >= :desde AND v.creado_ts < :hasta
+    GROUP BY 1, 2
+    UNION ALL
+    SELECT substr(c.creado_en, 1, 10), 'COMPRA', COUNT(DISTINCT c.id), SUM(cd.cantidad),
+           SUM(cd.costo_total), SUM(cd.costo_total)
+    FROM compras c JOIN compras_detalle cd ON cd.compra_id=c.id
+    WHERE c.creado_ts >= :desde AND c.creado_ts < :hasta
+    GROUP BY 1
+    UNION ALL
+    SELECT substr(creado_en, 1, 10), 'PRODUCCION', COUNT(*), SUM(cantidad), 0, 0
+    FROM producciones
+    WHERE creado_ts >= :desde AND creado_ts < :hasta
+    GROUP BY 1
+"""
+
+# Filas que respaldan los totales de un día; su hash es el checksum del corte
+_SQL_FILAS_DIA = (
+    ("""SELECT v.id, v.tipo, v.total, v.creado_en, d.id, d.producto_id, d.cantidad, d.precio_unitario,
+               d.subtotal, d.costo_total
+        FROM ventas v JOIN ventas_detalle d ON d.venta_id=v.id
+        WHERE v.creado_ts >= ? AND v.creado_ts < ? ORDER BY v.id, d.id"""),
+    ("""SELECT c.id, c.total, c.proveedor_id, c.creado_en, cd.id, cd.producto_id, cd.cantidad, cd.costo_total
+        FROM compras c JOIN compras_detalle cd ON cd.compra_id=c.id
+        WHERE c.creado_ts >= ? AND c.creado_ts < ? ORDER BY c.id, cd.id"""),
+    ("""SELECT id, producto_id, cantidad, creado_en FROM producciones
+        WHERE creado_ts >= ? AND creado_ts < ? ORDER BY id"""),
+)
+
+
+def _dia_siguiente(dia: str) -> str:
+    return (date.fromisoformat(dia) + timedelta(days=1)).isoformat()
+
+
+def _checksum_dia(conn, dia: str) -> Tuple[int, str]:
+    h = hashlib.sha256()
+    filas = 0
+    rango = _rango_ts(dia, dia)
+    for sql in _SQL_FILAS_DIA:
+        for r in conn.execute(sql, rango):
+            h.update(repr(tuple(r)).encode("utf-8"))
+            filas += 1
+        h.update(b"|")
+    return filas, h.hexdigest()
+
+
+@reintentar_tx()
+def cerrar_dia(dia: Optional[str] = None) -> Dict:
+    """
+    Corte del día: guarda los totales por concepto (ventas, merma, compras,
+    producción) y el checksum de las filas del día. Un día cerrado no se recalcula.
+    Solo se cierran días terminados; por defecto, ayer.
+    """
+    hoy = date.fromisoformat(_now_str()[:10])
+    dia = date.fromisoformat(dia[:10]) if dia else hoy - timedelta(days=1)
+    if dia >= hoy:
+        raise ValueError(f"Solo se pueden cerrar días terminados (antes de {hoy.isoformat()})")
+    dia = dia.isoformat()
+    with tx(modo="IMMEDIATE") as conn:
+        if conn.execute("SELECT 1 FROM cortes_dia WHERE dia=?", (dia,)).fetchone():
+            raise ValueError(f"El día {dia} ya tiene corte")
+        ini, fin = _rango_ts(dia, dia)
+        totales = conn.execute(_SQL_TOTALES_DIA, {"desde": ini, "hasta": fin}).fetchall()
+        filas, checksum = _checksum_dia(conn, dia)
+        conn.execute(
+            "INSERT INTO cortes_dia(dia, cerrado_en, filas, checksum) VALUES(?,?,?,?)",
+            (dia, _now_str(), filas, checksum),
+        )
+        conn.executemany(
+            """INSERT INTO cortes_dia_totales(dia, concepto, operaciones, cantidad, importe, costo)
+               VALUES(?,?,?,?,?,?)""",
+            [(dia, t["concepto"], t["operaciones"], t["cantidad"] or 0, t["importe"] or 0, t["costo"] or 0)
+             for t in totales],
+        )
+    return {"dia": dia, "filas": filas, "checksum": checksum,
+            "totales": {t["concepto"]: t["importe"] or 0 for t in totales}}
+
+
+def reabrir_dia(dia: str):
+    """Borra el corte de un día (p. ej. para corregir una captura y volver a cerrarlo)."""
+    with tx() as conn:
+        conn.execute("DELETE FROM cortes_dia_totales WHERE dia=?", (dia,))
+        conn.execute("DELETE FROM cortes_dia WHERE dia=?", (dia,))
+
+
+def listar_cortes(desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Dict]:
+    with lectura() as conn:
+        rows = conn.execute(
+            "SELECT dia, cerrado_en, filas, checksum FROM cortes_dia WHERE dia >= ? AND dia <= ? ORDER BY dia",
+            (desde or "0000-00-00", hasta or "9999-99-99"),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def verificar_cortes(desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Dict]:
+    """Días cerrados cuyas filas cambiaron después del corte (el checksum ya no coincide)."""
+    alterados = []
+    with lectura() as conn:
+        for c in conn.execute(
+            "SELECT dia, filas, checksum FROM cortes_dia WHERE dia >= ? AND dia <= ? ORDER BY dia",
+            (desde or "0000-00-00", hasta or "9999-99-99"),
+        ).fetchall():
+            filas, checksum = _checksum_dia(conn, c["dia"])
+            if checksum != c["checksum"]:
+                alterados.append({"dia": c["dia"], "filas_corte": c["filas"], "filas_actuales": filas,
+                                  "checksum_corte": c["checksum"], "checksum_actual": checksum})
+    return alterados
+
+
+def _intervalos_abiertos(desde: str, hasta: str, cerrados) -> List[Tuple[str, str]]:
+    # Tramos [inicio, fin) de días sin corte dentro de [desde, hasta]
+    tramos = []
+    d, fin = date.fromisoformat(desde), date.fromisoformat(hasta)
+    inicio = None
+    while d <= fin:
+        iso = d.isoformat()
+        if iso in cerrados:
+            if inicio:
+                tramos.append((inicio, iso)); inicio = None
+        elif inicio is None:
+            inicio = iso
+        d += timedelta(days=1)
+    if inicio:
+        tramos.append((inicio, _dia_siguiente(hasta)))
+    return tramos
+
+
+def resumen_diario(desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Dict]:
+    """
+    Totales por día y concepto. Los días con corte se leen de cortes_dia_totales;
+    solo los días abiertos se agregan desde las tablas de ventas/compras/producción.
+    """
+    with lectura() as conn:
+        if not desde:
+            r = conn.execute(
+                """SELECT MIN(x) AS ts, (SELECT MIN(dia) FROM cortes_dia) AS dia FROM (
+                       SELECT MIN(creado_ts) AS x FROM ventas
+                       UNION ALL SELECT MIN(creado_ts) FROM compras
+                       UNION ALL SELECT MIN(creado_ts) FROM producciones)"""
+            ).fetchone()
+            dias = [d for d in (r["dia"], _dia_de_ts(r["ts"]) if r["ts"] is not None else None) if d]
+            if not dias:
+                return []
+            desde = min(dias)
+        desde = date.fromisoformat(desde[:10]).isoformat()
+        hasta = date.fromisoformat((hasta or _now_str())[:10]).isoformat()
+
+        out = [
+            dict(r, cerrado=True)
+            for r in conn.execute(
+                """SELECT dia, concepto, operaciones, cantidad, importe, costo
+                   FROM cortes_dia_totales WHERE dia >= ? AND dia <= ?""",
+                (desde, hasta),
+            ).fetchall()
+        ]
+        cerrados = {r["dia"] for r in conn.execute(
+            "SELECT dia FROM cortes_dia WHERE dia >= ? AND dia <= ?", (desde, hasta))}
+        for ini, fin in _intervalos_abiertos(desde, hasta, cerrados):
+            out.extend(
+                dict(r, cerrado=False)
+                for r in conn.execute(_SQL_TOTALES_DIA, {"desde": _ts_dia(ini), "hasta": _ts_dia(fin)}).fetchall()
+            )
+    orden = {c: i for i, c in enumerate(CONCEPTOS_CORTE)}
+    out.sort(key=lambda r: (r["dia"], orden.get(r["concepto"], 99)))
+    return out
+
+
 def stock_disponible_producto(producto_id: int) -> float:
     """Devuelve el stock disponible convertido a la unidad del producto (Pieza/Gramo/Kilo)."""
     with conectar() as conn:
@@ -709,68 +1843,125 @@ def stock_disponible_producto(producto_id: int) -> float:
         return desde_base(r["unidad"], r["base"])
 
 
-def _ultimo_costo_unitario(conn, pid: int) -> float:
-    """Último costo_unitario pagado por ese producto (según compras_detalle)."""
-    r = conn.execute(
-        "SELECT costo_unitario FROM compras_detalle WHERE producto_id=? ORDER BY id DESC LIMIT 1",
-        (pid,)
-    ).fetchone()
-    if r and r["costo_unitario"] is not None:
-        return float(r["costo_unitario"])
-    r = conn.execute("SELECT costo FROM productos WHERE id=?", (pid,)).fetchone()
-    return float(r["costo"] or 0.0)
+def stock_vendibles() -> List[Dict]:
+    """
+    Stock de todos los vendibles en su unidad (Pieza/Gramo/Kilo), en una sola consulta.
+    Filas {"id", "stock"} (no un dict por id: por JSON las llaves enteras llegan como texto).
+    """
+    with conectar() as conn:
+        rows = conn.execute(
+            """SELECT p.id, p.unidad, IFNULL(SUM(i.cantidad_base), 0) AS base
+               FROM productos p
+               LEFT JOIN inventario i ON i.producto_id=p.id
+                     AND i.sucursal_id=(SELECT id FROM sucursales LIMIT 1)
+               WHERE p.es_vendible=1
+               GROUP BY p.id"""
+        ).fetchall()
+        return [{"id": r["id"], "stock": desde_base(r["unidad"], r["base"])} for r in rows]
+
+
+# productos.costo según el método: último costo de compra (ULTIMO y FIFO) o promedio ponderado
+_SQL_COSTO_PRODUCTO = {
+    "ULTIMO": "(SELECT cd.costo_unitario FROM compras_detalle cd WHERE cd.producto_id=productos.id ORDER BY cd.id DESC LIMIT 1)",
+    "PROMEDIO": """(SELECT NULLIF(i.costo_promedio, 0) FROM inventario i
+                    WHERE i.producto_id=productos.id AND i.sucursal_id=(SELECT id FROM sucursales LIMIT 1))""",
+}
+_SQL_COSTO_PRODUCTO["FIFO"] = _SQL_COSTO_PRODUCTO["ULTIMO"]
+
+
+@reintentar_tx()
+def cambiar_metodo_costo(metodo: str) -> str:
+    """
+    Cambia el método de costeo para todas las cajas que usan esta base.
+    Las capas y el promedio se mantienen con cualquier método, así que solo se
+    recalcula productos.costo para que no queden costos de dos métodos mezclados.
+    Las otras cajas toman el cambio al reiniciar; las compras lo leen en su transacción.
+    """
+    metodo = (metodo or "").upper()
+    if metodo not in METODOS_COSTO:
+        raise ValueError(f"El método de costeo debe ser uno de {METODOS_COSTO}")
+    global METODO_COSTO
+    with tx(modo="IMMEDIATE") as conn:
+        conn.execute(
+            """INSERT INTO config(clave, valor) VALUES ('metodo_costo', ?)
+               ON CONFLICT(clave) DO UPDATE SET valor=excluded.valor""",
+            (metodo,),
+        )
+        conn.execute(f"UPDATE productos SET costo = IFNULL({_SQL_COSTO_PRODUCTO[metodo]}, costo)")
+    METODO_COSTO = metodo
+    return metodo
+
+
+# Costo por unidad de producto según METODO_COSTO, para una lista de ids en una sola consulta
+_SQL_COSTO_UNITARIO = {
+    "ULTIMO": """IFNULL((SELECT cd.costo_unitario FROM compras_detalle cd
+                        WHERE cd.producto_id=p.id ORDER BY cd.id DESC LIMIT 1), IFNULL(p.costo, 0))""",
+    "PROMEDIO": """IFNULL((SELECT i.costo_promedio FROM inventario i
+                          WHERE i.producto_id=p.id AND i.sucursal_id=(SELECT id FROM sucursales LIMIT 1)),
+                         IFNULL(p.costo, 0))""",
+    # Próxima capa a consumir, convertida a costo por unidad del producto
+    "FIFO": """IFNULL((SELECT k.costo_base * (CASE p.unidad WHEN 'Kilo' THEN 1000.0 ELSE 1.0 END)
+                      FROM capas_costo k
+                      WHERE k.producto_id=p.id AND k.sucursal_id=(SELECT id FROM sucursales LIMIT 1)
+                        AND k.restante_base > 0
+                      ORDER BY k.id LIMIT 1),
+                     IFNULL(p.costo, 0))""",
+}
 
 
 def costo_estimado_producto(pid: int) -> float:
     """
     Costo por UNIDAD DE VENTA del producto:
-    - Insumo/Producto simple: último costo_unitario.
+    - Insumo/Producto simple: último costo_unitario, promedio ponderado o capa FIFO
+      más antigua (METODO_COSTO).
     - Elaborado: suma de (costo del componente segun unidad × cantidad_base de receta).
       cantidad_base está en g o pz POR pieza vendida del elaborado.
     """
     with conectar() as conn:
-        p = conn.execute(
-            """SELECT p.id, p.unidad, p.es_vendible, c.nombre AS categoria
-               FROM productos p LEFT JOIN categorias c ON c.id=p.categoria_id
-               WHERE p.id=?""",
-            (pid,)
-        ).fetchone()
-        if not p:
-            return 0.0
+        return _costo_estimado(conn, pid)
 
-        # Si NO es elaborado, devolvemos su último costo unitario
-        if p["categoria"] != "Elaborados":
-            return _ultimo_costo_unitario(conn, pid)
 
-        # Es elaborado: calcular por receta
-        receta = conn.execute(
-            "SELECT componente_producto_id, cantidad_base FROM recetas WHERE producto_menu_id=?",
-            (pid,)
-        ).fetchall()
-        if not receta:
-            return 0.0
-
-        total = 0.0
-        for row in receta:
-            comp_id = row["componente_producto_id"]
-            cant    = float(row["cantidad_base"] or 0.0)  # g o pz por pieza
-            comp = conn.execute(
-                "SELECT unidad FROM productos WHERE id=?",
-                (comp_id,)
-            ).fetchone()
-            if not comp:
-                continue
-            costo_u = _ultimo_costo_unitario(conn, comp_id)
-
-            # Convertir por UNIDAD del componente
-            u = comp["unidad"]  # "Pieza", "Gramo", "Kilo"
-            if u == "Pieza":
-                total += costo_u * cant                   # cant en pz
-            elif u == "Gramo":
-                total += costo_u * cant                   # costo_u ya es por gramo
-            elif u == "Kilo":
-                total += costo_u * (cant / 1000.0)        # cant en gramos → kilos
-            else:
-                total += costo_u * cant
+def _costo_estimado(conn, pid: int) -> float:
+    if METODO_COSTO not in _SQL_COSTO_UNITARIO:
+        raise ValueError(f"METODO_COSTO debe ser uno de {METODOS_COSTO}")
+    costo_sql = _SQL_COSTO_UNITARIO[METODO_COSTO]
+    p = conn.execute(
+        f"""SELECT p.id, p.unidad, p.es_vendible, c.nombre AS categoria, {costo_sql} AS costo_u
+            FROM productos p LEFT JOIN categorias c ON c.id=p.categoria_id
+            WHERE p.id=?""",
+        (pid,)
+    ).fetchone()
+    if not p:
+        return 0.0
+
+    # Si NO es elaborado, su costo unitario directo
+    if p["categoria"] != "Elaborados":
+        return float(p["costo_u"] or 0.0)
+
+    # Es elaborado: calcular por receta (componentes y su costo en la misma consulta)
+    receta = conn.execute(
+        f"""SELECT r.cantidad_base, p.unidad, {costo_sql} AS costo_u
+            FROM recetas r JOIN productos p ON p.id=r.componente_producto_id
+            WHERE r.producto_menu_id=?""",
+        (pid,)
+    ).fetchall()
+    if not receta:
+        return 0.0
+
+    total = 0.0
+    for row in receta:
+        cant    = float(row["cantidad_base"] or 0.0)  # g o pz por pieza
+        costo_u = float(row["costo_u"] or 0.0)
+
+        # Convertir por UNIDAD del componente
+        u = row["unidad"]  # "Pieza", "Gramo", "Kilo"
+        if u == "Pieza":
+            total += costo_u * cant                   # cant en pz
+        elif u == "Gramo":
+            total += costo_u * cant                   # costo_u ya es por gramo
+        elif u == "Kilo":
+            total += costo_u * (cant / 1000.0)        # cant en gramos → kilos
+        else:
+            total += costo_u * cant
 
-        return round(total, 6) 
\ No newline at end of file
+    return round(total, 6) 
\ No newline at end of file
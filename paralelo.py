@@ -0,0 +1,119 @@
+"""
+Reportes largos en varios procesos.
+
+El rango de fechas se parte en tramos de TRAMO_DIAS días; cada tramo corre en un
+proceso del pool con su propia conexión de solo lectura y los resultados se unen
+en orden de fecha. progreso(hechos, total) se llama al terminar cada tramo.
+
+Uso:  python paralelo.py ventas 2025-01-01 2025-12-31 [--procesos 4]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import db
+
+TRAMO_DIAS = 31
+
+# nombre -> (función de db, tabla de la que salen las fechas)
+REPORTES = {
+    "ventas": ("reporte_ventas_detallado", "ventas"),
+    "merma": ("reporte_merma_detallado", "ventas"),
+    "compras": ("reporte_compras_detallado", "compras"),
+}
+
+
+def tramos(desde: str, hasta: str, dias: int = TRAMO_DIAS) -> List[Tuple[str, str]]:
+    """Parte [desde, hasta] (inclusive) en tramos consecutivos sin traslape."""
+    d0, d1 = date.fromisoformat(desde[:10]), date.fromisoformat(hasta[:10])
+    out = []
+    while d0 <= d1:
+        fin = min(d0 + timedelta(days=dias - 1), d1)
+        out.append((d0.isoformat(), fin.isoformat()))
+        d0 = fin + timedelta(days=1)
+    return out
+
+
+def _limites(tabla: str) -> Tuple[Optional[str], Optional[str]]:
+    with db.lectura() as conn:
+        r = conn.execute(f"SELECT MIN(creado_ts) AS a, MAX(creado_ts) AS b FROM {tabla}").fetchone()
+    if r["a"] is None:
+        return None, None
+    return db._dia_de_ts(r["a"]), db._dia_de_ts(r["b"])
+
+
+def _correr_tramo(funcion: str, ruta_bd: str, metodo_costo: str, desde: str, hasta: str, kwargs: Dict) -> List[Dict]:
+    # Corre en el proceso hijo: con "spawn" db se importa de nuevo, así que se copia la configuración
+    db.DB_PATH = type(db.DB_PATH)(ruta_bd)
+    db.METODO_COSTO = metodo_costo
+    return getattr(db, funcion)(desde, hasta, **kwargs)
+
+
+def generar(
+    reporte: str,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    procesos: Optional[int] = None,
+    progreso: Optional[Callable[[int, int], None]] = None,
+    dias_por_tramo: int = TRAMO_DIAS,
+    **kwargs,
+) -> List[Dict]:
+    """
+    Mismo resultado que la función de db del reporte, calculado por tramos en paralelo.
+    Si el rango cabe en un tramo (o procesos=1) se calcula aquí mismo, sin pool.
+    """
+    if reporte not in REPORTES:
+        raise ValueError(f"Reporte desconocido: {reporte} (opciones: {', '.join(REPORTES)})")
+    funcion, tabla = REPORTES[reporte]
+    if not desde or not hasta:
+        primero, ultimo = _limites(tabla)
+        if primero is None:
+            return []
+        desde, hasta = desde or primero, hasta or ultimo
+
+    partes = tramos(desde, hasta, dias_por_tramo)
+    procesos = procesos or os.cpu_count() or 1
+    if len(partes) <= 1 or procesos <= 1:
+        out = []
+        for i, (a, b) in enumerate(partes, 1):
+            out.extend(getattr(db, funcion)(a, b, **kwargs))
+            if progreso:
+                progreso(i, len(partes))
+        return out
+
+    # spawn: el proceso padre puede tener hilos (Tk), fork no es seguro ahí
+    ctx = multiprocessing.get_context("spawn")
+    resultados: Dict[int, List[Dict]] = {}
+    with ProcessPoolExecutor(max_workers=min(procesos, len(partes)), mp_context=ctx) as pool:
+        futuros = {
+            pool.submit(_correr_tramo, funcion, str(db.DB_PATH), db.METODO_COSTO, a, b, kwargs): i
+            for i, (a, b) in enumerate(partes)
+        }
+        for hechos, fut in enumerate(as_completed(futuros), 1):
+            resultados[futuros[fut]] = fut.result()
+            if progreso:
+                progreso(hechos, len(partes))
+    return [fila for i in range(len(partes)) for fila in resultados[i]]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Reportes por tramos en varios procesos")
+    ap.add_argument("reporte", choices=list(REPORTES))
+    ap.add_argument("desde", nargs="?")
+    ap.add_argument("hasta", nargs="?")
+    ap.add_argument("--procesos", type=int, default=None)
+    ap.add_argument("--dias", type=int, default=TRAMO_DIAS, help="días por tramo")
+    ns = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    filas = generar(ns.reporte, ns.desde, ns.hasta, ns.procesos, dias_por_tramo=ns.dias,
+                    progreso=lambda h, t: print(f"\r{h}/{t} tramos", end="", flush=True))
+    print(f"\n{len(filas)} filas en {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
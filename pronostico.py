@@ -0,0 +1,291 @@
+"""
+Pronóstico de demanda diaria por producto vendible (requiere numpy).
+
+Suavizamiento exponencial con estacionalidad por día de la semana, calculado para
+todos los productos a la vez: la serie es una matriz productos × días y cada paso
+del tiempo es una operación vectorial.
+
+El estado ajustado (nivel y factores por día de la semana) se guarda en
+pronostico.npz junto a datos.db; la siguiente corrida solo procesa los días nuevos.
+
+Uso:  python pronostico.py [--horizonte 7]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import db
+
+ALPHA = 0.3           # peso del día más reciente en el nivel
+GAMMA = 0.1           # peso del día más reciente en el factor del día de la semana
+DIAS_HISTORIA = 730
+_EPS = 1e-9
+
+
+def ruta_cache() -> Path:
+    return db.DB_PATH.parent / "pronostico.npz"
+
+
+class ModeloDemanda:
+    def __init__(self, producto_ids, nivel, estacion, ultimo_dia: Optional[date], alpha=ALPHA, gamma=GAMMA):
+        self.producto_ids = np.asarray(producto_ids, dtype=np.int64)
+        self.nivel = np.asarray(nivel, dtype=np.float64)          # (P,)
+        self.estacion = np.asarray(estacion, dtype=np.float64)    # (7, P), lunes=0
+        self.ultimo_dia = ultimo_dia
+        self.alpha = alpha
+        self.gamma = gamma
+
+    @classmethod
+    def vacio(cls, producto_ids, alpha=ALPHA, gamma=GAMMA):
+        n = len(producto_ids)
+        return cls(producto_ids, np.zeros(n), np.ones((7, n)), None, alpha, gamma)
+
+    def alinear(self, producto_ids):
+        """Reordena el estado a la lista de productos dada; los nuevos empiezan en cero."""
+        producto_ids = np.asarray(producto_ids, dtype=np.int64)
+        if np.array_equal(producto_ids, self.producto_ids):
+            return
+        nivel = np.zeros(len(producto_ids))
+        estacion = np.ones((7, len(producto_ids)))
+        pos = {int(p): i for i, p in enumerate(self.producto_ids)}
+        dst = [j for j, p in enumerate(producto_ids) if int(p) in pos]
+        src = [pos[int(producto_ids[j])] for j in dst]
+        nivel[dst] = self.nivel[src]
+        estacion[:, dst] = self.estacion[:, src]
+        self.producto_ids, self.nivel, self.estacion = producto_ids, nivel, estacion
+
+    def actualizar(self, ventas: np.ndarray, primer_dia: date):
+        """ventas: matriz (P, D) de unidades vendidas por día a partir de primer_dia."""
+        if ventas.shape[1] == 0:
+            return
+        a, g = self.alpha, self.gamma
+        nivel, estacion = self.nivel, self.estacion
+        if self.ultimo_dia is None:
+            # Arranque: nivel = promedio de la primera semana disponible
+            nivel[:] = ventas[:, :7].mean(axis=1)
+        dow = primer_dia.weekday()
+        for t in range(ventas.shape[1]):
+            y = ventas[:, t]
+            s = estacion[dow]
+            nuevo = a * y / np.maximum(s, _EPS) + (1 - a) * nivel
+            activo = nuevo > _EPS
+            estacion[dow] = np.where(activo, g * y / np.maximum(nuevo, _EPS) + (1 - g) * s, s)
+            nivel[:] = nuevo
+            dow = (dow + 1) % 7
+            if dow == 0:
+                self._normalizar()
+        self._normalizar()
+        self.ultimo_dia = primer_dia + timedelta(days=ventas.shape[1] - 1)
+
+    def _normalizar(self):
+        # Factores con promedio 1; el nivel absorbe la escala para no cambiar el pronóstico
+        m = self.estacion.mean(axis=0)
+        ok = m > _EPS
+        self.estacion[:, ok] /= m[ok]
+        self.nivel[ok] *= m[ok]
+
+    def pronosticar(self, horizonte: int) -> np.ndarray:
+        """Matriz (P, horizonte) de demanda esperada a partir del día siguiente al último ajustado."""
+        inicio = (self.ultimo_dia or date.today() - timedelta(days=1)) + timedelta(days=1)
+        dows = [(inicio + timedelta(days=h)).weekday() for h in range(horizonte)]
+        return (self.estacion[dows] * self.nivel).T
+
+    def guardar(self, ruta: Path):
+        np.savez(
+            ruta,
+            producto_ids=self.producto_ids,
+            nivel=self.nivel,
+            estacion=self.estacion,
+            ultimo_dia=np.array(self.ultimo_dia.isoformat() if self.ultimo_dia else ""),
+            params=np.array([self.alpha, self.gamma]),
+        )
+
+    @classmethod
+    def cargar(cls, ruta: Path):
+        with np.load(ruta) as z:
+            ud = str(z["ultimo_dia"])
+            alpha, gamma = (float(x) for x in z["params"])
+            return cls(
+                z["producto_ids"], z["nivel"], z["estacion"],
+                date.fromisoformat(ud) if ud else None, alpha, gamma,
+            )
+
+
+def cargar_ventas_diarias(producto_ids: np.ndarray, desde: date, hasta: date) -> np.ndarray:
+    """Matriz (P, D) con las unidades vendidas por producto y día, desde..hasta inclusive."""
+    dias = (hasta - desde).days + 1
+    m = np.zeros((len(producto_ids), max(dias, 0)))
+    if dias <= 0 or len(producto_ids) == 0:
+        return m
+    with db.conectar() as conn:
+        rows = conn.execute(
+            """SELECT d.producto_id, date(v.creado_en) AS dia, SUM(d.cantidad) AS cant
+               FROM ventas v JOIN ventas_detalle d ON d.venta_id=v.id
+               WHERE v.tipo='VENTA' AND v.creado_ts >= ? AND v.creado_ts < ?
+               GROUP BY d.producto_id, dia""",
+            db._rango_ts(desde, hasta),
+        ).fetchall()
+    if not rows:
+        return m
+    pid = np.fromiter((r["producto_id"] for r in rows), dtype=np.int64, count=len(rows))
+    dia = np.fromiter(
+        ((date.fromisoformat(r["dia"]) - desde).days for r in rows), dtype=np.int64, count=len(rows)
+    )
+    cant = np.fromiter((r["cant"] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+    orden = np.argsort(producto_ids)
+    pos = np.searchsorted(producto_ids, pid, sorter=orden)
+    pos = np.clip(pos, 0, len(producto_ids) - 1)
+    fila = orden[pos]
+    ok = producto_ids[fila] == pid
+    np.add.at(m, (fila[ok], dia[ok]), cant[ok])
+    return m
+
+
+def _vendibles():
+    with db.conectar() as conn:
+        rows = conn.execute(
+            """SELECT p.id, p.nombre, p.unidad, c.nombre AS categoria
+               FROM productos p LEFT JOIN categorias c ON c.id=p.categoria_id
+               WHERE p.es_vendible=1 ORDER BY p.id"""
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def ajustar_modelo(
+    dias_historia: int = DIAS_HISTORIA, alpha: float = ALPHA, gamma: float = GAMMA, usar_cache: bool = True
+) -> ModeloDemanda:
+    """Ajusta (o continúa desde cache) el modelo hasta ayer; hoy aún no es un día completo."""
+    ids = np.array([p["id"] for p in _vendibles()], dtype=np.int64)
+    ayer = datetime.now().date() - timedelta(days=1)
+    ruta = ruta_cache()
+
+    modelo = None
+    if usar_cache and ruta.exists():
+        try:
+            modelo = ModeloDemanda.cargar(ruta)
+        except (OSError, KeyError, ValueError):
+            modelo = None
+        if modelo is not None and (modelo.alpha, modelo.gamma) != (alpha, gamma):
+            modelo = None
+    if modelo is None:
+        modelo = ModeloDemanda.vacio(ids, alpha, gamma)
+    modelo.alinear(ids)
+
+    desde = (modelo.ultimo_dia + timedelta(days=1)) if modelo.ultimo_dia else ayer - timedelta(days=dias_historia - 1)
+    if desde <= ayer:
+        modelo.actualizar(cargar_ventas_diarias(ids, desde, ayer), desde)
+        if usar_cache:
+            modelo.guardar(ruta)
+    return modelo
+
+
+def pronosticar(horizonte: int = 7, modelo: Optional[ModeloDemanda] = None) -> List[Dict]:
+    modelo = modelo or ajustar_modelo()
+    f = modelo.pronosticar(horizonte)
+    info = {p["id"]: p for p in _vendibles()}
+    out = []
+    for i, pid in enumerate(modelo.producto_ids):
+        p = info.get(int(pid))
+        if not p:
+            continue
+        out.append({
+            "producto_id": int(pid),
+            "nombre": p["nombre"],
+            "categoria": p["categoria"] or "",
+            "por_dia": [round(float(x), 3) for x in f[i]],
+            "total": round(float(f[i].sum()), 3),
+        })
+    return out
+
+
+def _stock_base(conn) -> Dict[int, float]:
+    return {
+        r["producto_id"]: r["base"]
+        for r in conn.execute("SELECT producto_id, SUM(cantidad_base) AS base FROM inventario GROUP BY producto_id")
+    }
+
+
+def sugerencias_produccion(horizonte: int = 1, modelo: Optional[ModeloDemanda] = None) -> List[Dict]:
+    """Piezas de cada Elaborado a producir para cubrir la demanda pronosticada, descontando stock."""
+    demanda = {p["producto_id"]: p for p in pronosticar(horizonte, modelo)}
+    with db.conectar() as conn:
+        stock = _stock_base(conn)
+        unidades = {r["id"]: r["unidad"] for r in conn.execute("SELECT id, unidad FROM productos")}
+    out = []
+    for pid, p in demanda.items():
+        if p["categoria"] != "Elaborados":
+            continue
+        disp = db.desde_base(unidades[pid], stock.get(pid, 0.0))
+        falta = p["total"] - disp
+        if falta > 0:
+            out.append({"producto_id": pid, "nombre": p["nombre"], "pronostico": p["total"],
+                        "stock": disp, "producir": round(falta, 3)})
+    return out
+
+
+def sugerencias_compra(horizonte: int = 7, modelo: Optional[ModeloDemanda] = None) -> List[Dict]:
+    """
+    Compras sugeridas: Productos de reventa por su pronóstico directo e Insumos por
+    la producción sugerida explotada con las recetas.
+    """
+    demanda = pronosticar(horizonte, modelo)
+    with db.conectar() as conn:
+        stock = _stock_base(conn)
+        prods = {r["id"]: dict(r) for r in conn.execute(
+            """SELECT p.id, p.nombre, p.unidad, c.nombre AS categoria
+               FROM productos p LEFT JOIN categorias c ON c.id=p.categoria_id"""
+        )}
+        recetas = conn.execute("SELECT producto_menu_id, componente_producto_id, cantidad_base FROM recetas").fetchall()
+
+    necesidad: Dict[int, float] = {}   # en unidad base
+    producir: Dict[int, float] = {}
+    for p in demanda:
+        pid = p["producto_id"]
+        u = prods[pid]["unidad"]
+        if p["categoria"] == "Productos":
+            necesidad[pid] = necesidad.get(pid, 0.0) + db.a_base(u, p["total"])
+        elif p["categoria"] == "Elaborados":
+            falta = p["total"] - db.desde_base(u, stock.get(pid, 0.0))
+            if falta > 0:
+                producir[pid] = falta
+    for r in recetas:
+        q = producir.get(r["producto_menu_id"])
+        if q:
+            cid = r["componente_producto_id"]
+            necesidad[cid] = necesidad.get(cid, 0.0) + q * r["cantidad_base"]
+
+    out = []
+    for pid, req in sorted(necesidad.items(), key=lambda kv: prods[kv[0]]["nombre"]):
+        falta = req - stock.get(pid, 0.0)
+        if falta <= _EPS:
+            continue
+        u = prods[pid]["unidad"]
+        out.append({"producto_id": pid, "nombre": prods[pid]["nombre"], "unidad": u,
+                    "necesidad": round(db.desde_base(u, req), 3),
+                    "stock": round(db.desde_base(u, stock.get(pid, 0.0)), 3),
+                    "comprar": round(db.desde_base(u, falta), 3)})
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pronóstico de demanda por producto")
+    ap.add_argument("--horizonte", type=int, default=7)
+    ap.add_argument("--sin-cache", action="store_true")
+    ns = ap.parse_args(argv)
+
+    modelo = ajustar_modelo(usar_cache=not ns.sin_cache)
+    for p in pronosticar(ns.horizonte, modelo):
+        print(f'{p["nombre"]:<30} {p["total"]:>10.2f}  {p["por_dia"]}')
+    print("\nProducción sugerida (mañana):")
+    for s in sugerencias_produccion(1, modelo):
+        print(f'  {s["nombre"]:<30} {s["producir"]:>8.2f} pz')
+    print(f"\nCompras sugeridas ({ns.horizonte} días):")
+    for s in sugerencias_compra(ns.horizonte, modelo):
+        print(f'  {s["nombre"]:<30} {s["comprar"]:>10.3f} {s["unidad"]}')
+
+
+if __name__ == "__main__":
+    main()
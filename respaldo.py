@@ -0,0 +1,151 @@
+"""
+Respaldos en línea de datos.db con la API de backup de SQLite.
+
+La copia avanza por pasos de pocas páginas y duerme entre pasos (desde el callback
+de progreso: el `sleep` de Connection.backup solo se usa cuando la base está
+ocupada), así las ventas pueden escribir mientras se respalda. Cada copia se verifica con
+PRAGMA integrity_check, se comprime con gzip y se rota (se conservan las últimas N).
+
+Uso:  python respaldo.py [--conservar 14]
+"""
+import argparse
+import gzip
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import db
+
+PAGINAS_POR_PASO = 64
+PAUSA_ENTRE_PASOS_S = 0.005
+REINTENTO_OCUPADO_S = 0.25   # espera de backup() tras SQLITE_BUSY/SQLITE_LOCKED
+CONSERVAR = 14
+INTERVALO_HORAS = 4.0
+_PREFIJO = "datos-"
+
+
+def dir_respaldos() -> Path:
+    return db.DB_PATH.parent / "respaldos"
+
+
+def _rotar(carpeta: Path, conservar: int):
+    copias = sorted(carpeta.glob(f"{_PREFIJO}*.db.gz"))
+    for viejo in copias[:-conservar] if conservar > 0 else []:
+        viejo.unlink(missing_ok=True)
+
+
+def respaldar(
+    carpeta: Optional[Path] = None,
+    paginas_por_paso: int = PAGINAS_POR_PASO,
+    pausa: float = PAUSA_ENTRE_PASOS_S,
+    conservar: int = CONSERVAR,
+) -> Dict:
+    """Hace un respaldo comprimido y verificado. Devuelve estadísticas de la corrida."""
+    carpeta = Path(carpeta) if carpeta else dir_respaldos()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    sello = datetime.now().strftime("%Y%m%d-%H%M%S")
+    tmp = carpeta / f"{_PREFIJO}{sello}.db.tmp"
+    final = carpeta / f"{_PREFIJO}{sello}.db.gz"
+
+    progreso = {"total": 0, "pasos": 0}
+
+    def _progreso(status, restantes, total):
+        progreso["total"] = total
+        progreso["pasos"] += 1
+        if restantes > 0 and pausa > 0:
+            time.sleep(pausa)   # cede el candado entre pasos
+
+    t0 = time.perf_counter()
+    src = db.conectar()
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst, pages=paginas_por_paso, progress=_progreso, sleep=REINTENTO_OCUPADO_S)
+        t_copia = time.perf_counter() - t0
+        integridad = dst.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+
+    try:
+        if integridad != "ok":
+            raise RuntimeError(f"Respaldo corrupto ({integridad}); se descartó {tmp.name}")
+        with open(tmp, "rb") as fi, gzip.open(final, "wb", compresslevel=6) as fo:
+            shutil.copyfileobj(fi, fo, 1024 * 1024)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    _rotar(carpeta, conservar)
+    segundos = time.perf_counter() - t0
+    paginas = progreso["total"]
+    return {
+        "ruta": str(final),
+        "paginas": paginas,
+        "pasos": progreso["pasos"],
+        "segundos_copia": round(t_copia, 3),
+        "segundos": round(segundos, 3),
+        "paginas_por_s": round(paginas / t_copia, 1) if t_copia > 0 else float(paginas),
+        "bytes": final.stat().st_size,
+        "integridad": integridad,
+    }
+
+
+def restaurar(respaldo: Path, destino: Optional[Path] = None):
+    """Descomprime un respaldo sobre `destino` (por defecto datos.db). Cerrar la app antes."""
+    destino = Path(destino) if destino else db.DB_PATH
+    with gzip.open(respaldo, "rb") as fi, open(destino, "wb") as fo:
+        shutil.copyfileobj(fi, fo, 1024 * 1024)
+    for ext in ("-wal", "-shm"):
+        Path(str(destino) + ext).unlink(missing_ok=True)
+
+
+class RespaldoProgramado(threading.Thread):
+    """Hilo en segundo plano que respalda cada `intervalo_horas` y anota el resultado en bitacora.txt."""
+
+    def __init__(self, intervalo_horas: float = INTERVALO_HORAS, conservar: int = CONSERVAR,
+                 al_terminar: Optional[Callable[[Dict], None]] = None):
+        super().__init__(name="respaldo", daemon=True)
+        self.intervalo = max(intervalo_horas, 0.01) * 3600.0
+        self.conservar = conservar
+        self.al_terminar = al_terminar
+        self.ultimo: Optional[Dict] = None
+        self._alto = threading.Event()
+
+    def detener(self):
+        self._alto.set()
+
+    def run(self):
+        while not self._alto.wait(self.intervalo):
+            try:
+                res = respaldar(conservar=self.conservar)
+                linea = (f'{datetime.now():%Y-%m-%d %H:%M:%S} OK {Path(res["ruta"]).name} '
+                         f'{res["paginas"]} págs {res["segundos"]:.2f}s {res["paginas_por_s"]:.0f} págs/s')
+            except Exception as e:
+                res = {"error": str(e)}
+                linea = f"{datetime.now():%Y-%m-%d %H:%M:%S} ERROR {e}"
+            self.ultimo = res
+            try:
+                dir_respaldos().mkdir(parents=True, exist_ok=True)
+                with open(dir_respaldos() / "bitacora.txt", "a", encoding="utf-8") as f:
+                    f.write(linea + "\n")
+            except OSError:
+                pass
+            if self.al_terminar:
+                self.al_terminar(res)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Respaldo en línea de datos.db")
+    ap.add_argument("--conservar", type=int, default=CONSERVAR)
+    ap.add_argument("--paginas", type=int, default=PAGINAS_POR_PASO, help="páginas por paso")
+    ns = ap.parse_args(argv)
+    res = respaldar(paginas_por_paso=ns.paginas, conservar=ns.conservar)
+    print(f'{res["ruta"]}: {res["paginas"]} páginas en {res["segundos"]:.2f}s '
+          f'({res["paginas_por_s"]:.0f} págs/s), {res["bytes"]} bytes, integridad {res["integridad"]}')
+
+
+if __name__ == "__main__":
+    main()
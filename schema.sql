@@ -37,9 +37,11 @@ CREATE TABLE IF NOT EXISTS inventario(
   producto_id INTEGER NOT NULL REFERENCES productos(id),
   sucursal_id INTEGER NOT NULL REFERENCES sucursales(id),
   cantidad_base REAL NOT NULL DEFAULT 0,
+  costo_promedio REAL NOT NULL DEFAULT 0,
   UNIQUE(producto_id, sucursal_id)
 );
 
+-- creado_ts (segundos Unix) se indexa y se completa por trigger en db._migrar_creado_ts
 CREATE TABLE IF NOT EXISTS movimientos_inventario(
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   producto_id INTEGER NOT NULL REFERENCES productos(id),
@@ -49,7 +51,8 @@ CREATE TABLE IF NOT EXISTS movimientos_inventario(
   ref_tabla TEXT,
   ref_id INTEGER,
   nota TEXT,
-  creado_en TEXT NOT NULL DEFAULT (datetime('now'))
+  creado_en TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+  creado_ts INTEGER
 );
 
 CREATE TABLE IF NOT EXISTS proveedores(
@@ -62,7 +65,8 @@ CREATE TABLE IF NOT EXISTS proveedores(
 CREATE TABLE IF NOT EXISTS compras(
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   sucursal_id INTEGER NOT NULL REFERENCES sucursales(id),
-  creado_en TEXT NOT NULL DEFAULT (datetime('now')),
+  creado_en TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+  creado_ts INTEGER,
   total REAL NOT NULL DEFAULT 0,
   proveedor_id INTEGER REFERENCES proveedores(id)
 );
@@ -87,7 +91,8 @@ CREATE TABLE IF NOT EXISTS ventas(
   tipo TEXT NOT NULL CHECK(tipo IN ('VENTA','MERMA')) DEFAULT 'VENTA',
   sucursal_id INTEGER NOT NULL REFERENCES sucursales(id),
   cajero TEXT,
-  creado_en TEXT NOT NULL DEFAULT (datetime('now')),
+  creado_en TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+  creado_ts INTEGER,
   total REAL NOT NULL DEFAULT 0
 );
 
@@ -97,7 +102,8 @@ CREATE TABLE IF NOT EXISTS ventas_detalle(
   producto_id INTEGER NOT NULL REFERENCES productos(id),
   cantidad REAL NOT NULL CHECK(cantidad > 0),
   precio_unitario REAL NOT NULL CHECK(precio_unitario >= 0),
-  subtotal REAL NOT NULL
+  subtotal REAL NOT NULL,
+  costo_total REAL
 );
 
 CREATE TABLE IF NOT EXISTS producciones(
@@ -106,7 +112,80 @@ CREATE TABLE IF NOT EXISTS producciones(
   sucursal_id INTEGER NOT NULL REFERENCES sucursales(id),
   cantidad REAL NOT NULL CHECK(cantidad > 0),
   nota TEXT,
-  creado_en TEXT NOT NULL DEFAULT (datetime('now'))
+  creado_en TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+  creado_ts INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS archivos_movimientos(
+  periodo TEXT PRIMARY KEY,
+  ruta TEXT NOT NULL,
+  filas INTEGER NOT NULL DEFAULT 0,
+  archivado_en TEXT NOT NULL
+);
+
+-- Saldos del libro de movimientos hasta conciliacion_estado.ultimo_mov_id
+CREATE TABLE IF NOT EXISTS saldos_libro(
+  producto_id INTEGER NOT NULL,
+  sucursal_id INTEGER NOT NULL,
+  cantidad_base REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY(producto_id, sucursal_id)
+);
+
+CREATE TABLE IF NOT EXISTS conciliacion_estado(
+  id INTEGER PRIMARY KEY CHECK(id = 1),
+  ultimo_mov_id INTEGER NOT NULL DEFAULT 0,
+  conciliado_en TEXT
+);
+
+CREATE TABLE IF NOT EXISTS consumo_diario(
+  producto_id INTEGER NOT NULL,
+  sucursal_id INTEGER NOT NULL,
+  dia TEXT NOT NULL,
+  cantidad_base REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY(producto_id, sucursal_id, dia)
+);
+
+CREATE TABLE IF NOT EXISTS ventas_por_hora(
+  dia TEXT NOT NULL,
+  hora INTEGER NOT NULL,
+  dia_semana INTEGER NOT NULL,
+  producto_id INTEGER NOT NULL,
+  tipo TEXT NOT NULL,
+  cantidad REAL NOT NULL DEFAULT 0,
+  ingreso REAL NOT NULL DEFAULT 0,
+  lineas INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY(dia, hora, producto_id, tipo)
+);
+
+CREATE TABLE IF NOT EXISTS capas_costo(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  producto_id INTEGER NOT NULL REFERENCES productos(id),
+  sucursal_id INTEGER NOT NULL REFERENCES sucursales(id),
+  origen TEXT NOT NULL,
+  ref_id INTEGER,
+  cantidad_base REAL NOT NULL,
+  restante_base REAL NOT NULL,
+  costo_base REAL NOT NULL,
+  creado_en TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_capas_abiertas
+  ON capas_costo(producto_id, sucursal_id, id) WHERE restante_base > 0;
+
+CREATE TABLE IF NOT EXISTS cortes_dia(
+  dia TEXT PRIMARY KEY,
+  cerrado_en TEXT NOT NULL,
+  filas INTEGER NOT NULL,
+  checksum TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cortes_dia_totales(
+  dia TEXT NOT NULL REFERENCES cortes_dia(dia) ON DELETE CASCADE,
+  concepto TEXT NOT NULL,
+  operaciones INTEGER NOT NULL,
+  cantidad REAL NOT NULL,
+  importe REAL NOT NULL,
+  costo REAL NOT NULL,
+  PRIMARY KEY(dia, concepto)
 );
 
 CREATE TRIGGER IF NOT EXISTS inventario_despues_producto
@@ -122,3 +201,30 @@ BEGIN
   INSERT OR IGNORE INTO inventario(producto_id, sucursal_id, cantidad_base)
   SELECT p.id, NEW.id, 0 FROM productos p;
 END;
+
+CREATE TRIGGER IF NOT EXISTS consumo_despues_movimiento
+AFTER INSERT ON movimientos_inventario
+WHEN NEW.motivo IN ('VENTA','MERMA','PRODUCCION') AND NEW.cantidad_base < 0
+BEGIN
+  INSERT INTO consumo_diario(producto_id, sucursal_id, dia, cantidad_base)
+  VALUES (NEW.producto_id, NEW.sucursal_id, substr(NEW.creado_en, 1, 10), -NEW.cantidad_base)
+  ON CONFLICT(producto_id, sucursal_id, dia)
+  DO UPDATE SET cantidad_base = cantidad_base + excluded.cantidad_base;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ventas_hora_despues_detalle
+AFTER INSERT ON ventas_detalle
+BEGIN
+  INSERT INTO ventas_por_hora(dia, hora, dia_semana, producto_id, tipo, cantidad, ingreso, lineas)
+  SELECT substr(v.creado_en, 1, 10), CAST(substr(v.creado_en, 12, 2) AS INTEGER),
+         (CAST(strftime('%w', v.creado_en) AS INTEGER) + 6) % 7,
+         NEW.producto_id, v.tipo, NEW.cantidad, NEW.subtotal, 1
+  FROM ventas v WHERE v.id = NEW.venta_id
+  ON CONFLICT(dia, hora, producto_id, tipo)
+  DO UPDATE SET cantidad = cantidad + excluded.cantidad,
+                ingreso = ingreso + excluded.ingreso,
+                lineas = lineas + 1;
+END;
+
+-- La tabla cambios y sus triggers (refresco en vivo) se generan en db._migraciones
+-- a partir de db.TABLAS_VIGILADAS.
@@ -0,0 +1,205 @@
+"""
+Servidor local (asyncio, solo stdlib) para que varias cajas compartan un único
+proceso dueño de datos.db.
+
+- Las operaciones de escritura se ejecutan en un solo hilo (escritor serializado).
+- Las de lectura se reparten en un pool de hilos lectores.
+- Protocolo: HTTP/1.1 mínimo con cuerpo JSON.
+    POST /rpc          {"metodo": "registrar_venta", "args": [...], "kwargs": {...}}
+    GET  /operaciones  lista de métodos expuestos
+
+Uso:  python servidor.py --host 127.0.0.1 --puerto 8765
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import db
+from analitica import pivote_ventas
+from respaldo import RespaldoProgramado
+
+HOST_DEFAULT = "127.0.0.1"
+PUERTO_DEFAULT = 8765
+
+OPERACIONES_ESCRITURA = {
+    "crear_proveedor",
+    "crear_producto",
+    "definir_receta_producto",
+    "ajustar",
+    "registrar_compra",
+    "registrar_produccion",
+    "registrar_orden_produccion",
+    "cerrar_dia",
+    "reabrir_dia",
+    "cambiar_metodo_costo",
+    "registrar_venta",
+}
+
+OPERACIONES_LECTURA = {
+    "listar_categorias",
+    "listar_proveedores",
+    "listar_productos",
+    "listar_insumos",
+    "listar_elaborados",
+    "listar_vendibles",
+    "listar_para_compras",
+    "buscar_vendible_por_codigo",
+    "buscar_vendibles_por_texto",
+    "obtener_receta",
+    "inventario_actual",
+    "stock_disponible_producto",
+    "stock_vendibles",
+    "costo_estimado_producto",
+    "reporte_ventas_detallado",
+    "reporte_merma_detallado",
+    "reporte_compras_detallado",
+    "top_productos",
+    "alertas_reorden",
+    "valuacion_inventario",
+    "resumen_diario",
+    "listar_cortes",
+    "verificar_cortes",
+    "reporte_heatmap",
+    "version_cambios",
+    "cambios_desde",
+    "pivote_ventas",
+}
+
+# Operaciones que no viven en db
+_OPERACIONES_EXTRA = {"pivote_ventas": pivote_ventas}
+
+_MAX_CUERPO = 8 * 1024 * 1024
+_ESTADOS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _a_json(o):
+    # Filas tipadas de db (db.Fila) viajan como objeto JSON; lo demás como texto
+    if isinstance(o, db.Fila):
+        return o._asdict()
+    return str(o)
+
+
+class ServidorCafeteria:
+    def __init__(self, host: str = HOST_DEFAULT, puerto: int = PUERTO_DEFAULT, lectores: int = 4):
+        self.host = host
+        self.puerto = puerto
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="escritor")
+        self._lectores = ThreadPoolExecutor(max_workers=max(1, lectores), thread_name_prefix="lector")
+        self._server = None
+
+    async def iniciar(self):
+        self._server = await asyncio.start_server(self._atender, self.host, self.puerto)
+        # Si se pidió puerto 0, guardamos el que asignó el sistema
+        self.puerto = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def servir(self):
+        if self._server is None:
+            await self.iniciar()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def cerrar(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._escritor.shutdown(wait=True)
+        self._lectores.shutdown(wait=True)
+
+    async def ejecutar(self, metodo: str, args=None, kwargs=None):
+        if metodo in OPERACIONES_ESCRITURA:
+            pool = self._escritor
+        elif metodo in OPERACIONES_LECTURA:
+            pool = self._lectores
+        else:
+            raise LookupError(f"Operación '{metodo}' no disponible")
+        fn = _OPERACIONES_EXTRA.get(metodo) or getattr(db, metodo)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, partial(fn, *(args or []), **(kwargs or {})))
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            estado, cuerpo = await self._procesar(reader)
+        except Exception as e:
+            estado, cuerpo = 400, {"ok": False, "tipo": type(e).__name__, "error": str(e)}
+        datos = json.dumps(cuerpo, ensure_ascii=False, default=_a_json).encode("utf-8")
+        cabecera = (
+            f"HTTP/1.1 {estado} {_ESTADOS.get(estado, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(datos)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii")
+        try:
+            writer.write(cabecera + datos)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _procesar(self, reader: asyncio.StreamReader):
+        linea = (await reader.readline()).decode("latin-1").strip()
+        if not linea:
+            raise ValueError("Petición vacía")
+        verbo, ruta, _ = linea.split(" ", 2)
+
+        cabeceras = {}
+        while True:
+            h = (await reader.readline()).decode("latin-1")
+            if h in ("\r\n", "\n", ""):
+                break
+            k, _, v = h.partition(":")
+            cabeceras[k.strip().lower()] = v.strip()
+
+        if verbo == "GET" and ruta == "/operaciones":
+            return 200, {"ok": True, "lectura": sorted(OPERACIONES_LECTURA), "escritura": sorted(OPERACIONES_ESCRITURA)}
+        if verbo != "POST" or ruta != "/rpc":
+            return 404, {"ok": False, "tipo": "LookupError", "error": f"Ruta {verbo} {ruta} no existe"}
+
+        largo = int(cabeceras.get("content-length", "0") or 0)
+        if largo > _MAX_CUERPO:
+            return 413, {"ok": False, "tipo": "ValueError", "error": "Petición demasiado grande"}
+        peticion = json.loads((await reader.readexactly(largo)).decode("utf-8") if largo else "{}")
+
+        try:
+            res = await self.ejecutar(peticion.get("metodo", ""), peticion.get("args"), peticion.get("kwargs"))
+        except LookupError as e:
+            return 404, {"ok": False, "tipo": "LookupError", "error": str(e)}
+        except ValueError as e:
+            return 200, {"ok": False, "tipo": "ValueError", "error": str(e)}
+        except Exception as e:
+            return 500, {"ok": False, "tipo": type(e).__name__, "error": str(e)}
+        return 200, {"ok": True, "resultado": res}
+
+
+def _preparar_bd(sucursal=None):
+    with db.conectar() as conn:
+        db._crear_tablas_basicas(conn)
+        db._migraciones(conn)
+    if sucursal:
+        db.iniciar_bd(sucursal)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Servidor local de Cafetería Alé Alí")
+    ap.add_argument("--host", default=HOST_DEFAULT)
+    ap.add_argument("--puerto", type=int, default=PUERTO_DEFAULT)
+    ap.add_argument("--lectores", type=int, default=4, help="hilos de lectura")
+    ap.add_argument("--sucursal", default=None, help="crea la sucursal si no existe")
+    ap.add_argument("--respaldo-horas", type=float, default=4.0, help="intervalo de respaldo; 0 lo desactiva")
+    ns = ap.parse_args(argv)
+
+    _preparar_bd(ns.sucursal)
+    if ns.respaldo_horas > 0:
+        RespaldoProgramado(ns.respaldo_horas).start()
+    srv = ServidorCafeteria(ns.host, ns.puerto, ns.lectores)
+    print(f"Escuchando en http://{ns.host}:{ns.puerto}")
+    try:
+        asyncio.run(srv.servir())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()